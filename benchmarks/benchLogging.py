@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+# Measures what logging costs the pipeline at WARNING, the level artists run at, against DEBUG:
+#
+#   python benchmarks/benchLogging.py --characters 5000 --repeat 3
+#
+# Parses a synthetic character xml through xgenSetup.generate_characters, which logs every character it creates, and
+# times the eager str.format style against deferred %-style arguments and isEnabledFor guards in a tight loop.  The
+# records go to os.devnull so only the cost of producing them is measured.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xgenSetup as lxg
+from syntheticScene import write_catalog
+
+LEVELS = (("WARNING", logging.WARNING), ("DEBUG", logging.DEBUG))
+
+
+def best_of(repeat, func, *args):
+    """ The fastest of repeat runs of func, in seconds """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(*args)
+        seconds = time.time() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def eager_loop(lg, character, count):
+    for i in range(count):
+        lg.debug("Character: {0}, number {1}".format(character, i))
+
+
+def deferred_loop(lg, character, count):
+    for i in range(count):
+        lg.debug("Character: %s, number %s", character, i)
+
+
+def guarded_loop(lg, character, count):
+    debug = lg.isEnabledFor(logging.DEBUG)
+    for i in range(count):
+        if debug:
+            lg.debug("Character: %s, number %s", character, i)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times lettuce logging overhead at WARNING and DEBUG")
+    parser.add_argument("--characters", type=int, default=2000, help="Characters in the synthetic xml")
+    parser.add_argument("--calls", type=int, default=100000, help="Log calls per style in the loop benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the fastest is reported")
+    args = parser.parse_args(argv)
+
+    lg = logging.getLogger("lettuce")
+    devnull = open(os.devnull, "w")
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s.%(funcName)s - %(levelname)s - %(message)s"))
+    lg.addHandler(handler)
+
+    temp_dir = tempfile.mkdtemp(prefix="lettuce_bench_")
+    xml_file = os.path.join(temp_dir, "catalog.xml")
+    write_catalog(xml_file, args.characters)
+
+    character = lxg.generate_characters(xml_file)[0]
+    loop_lg = logging.getLogger("lettuce.benchLogging")
+
+    results = []
+    try:
+        for name, level in LEVELS:
+            lg.setLevel(level)
+            results.append((name, "generate_characters ({} characters)".format(args.characters),
+                            best_of(args.repeat, lxg.generate_characters, xml_file)))
+            for style, loop in (("eager format", eager_loop),
+                                ("deferred %-style", deferred_loop),
+                                ("isEnabledFor guard", guarded_loop)):
+                results.append((name, "{0} ({1} calls)".format(style, args.calls),
+                                best_of(args.repeat, loop, loop_lg, character, args.calls)))
+    finally:
+        lg.removeHandler(handler)
+        devnull.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("{0:<8} {1:<48} {2:>10}".format("level", "benchmark", "seconds"))
+    for level, name, seconds in results:
+        print("{0:<8} {1:<48} {2:>10.4f}".format(level, name, seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
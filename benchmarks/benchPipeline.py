@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+# Times the xgenSetup pipeline functions on synthetic scenes in the fakeMaya stand-in, at several scene sizes:
+#
+#   python benchmarks/benchPipeline.py --call-cost 20 --sizes small medium large --json results.json
+#
+# Each stage reports its wall time and the number of Maya commands it issued, with the most called commands.
+# --call-cost charges every command that many microseconds, the wall time then approximates a scene where Maya's
+# per command overhead dominates.  --trace also records the runs with lettuceTrace.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeMaya
+import syntheticScene
+import lettuceTrace
+
+# Catalog characters, characters in the scene, references, mesh history nodes and nodes per hair file
+SIZES = {"small": dict(catalog=100, characters=2, references=10, history=50, hair_nodes=20),
+         "medium": dict(catalog=1000, characters=5, references=100, history=500, hair_nodes=100),
+         "large": dict(catalog=10000, characters=10, references=1000, history=5000, hair_nodes=500),
+         }
+
+SIZE_ORDER = ("small", "medium", "large")
+
+# Commands listed per stage
+TOP_COMMANDS = 3
+
+
+def run_size(name, size, call_cost, plates=2):
+    """
+    Runs every stage on a fresh synthetic scene
+    :param name: The size's name, for the results
+    :param size: A dict from SIZES
+    :param call_cost: Seconds charged per Maya command
+    :param plates: Hair plates per character
+    :return: A list of result dicts, one per stage
+    """
+    import xgenSetup as lxg
+
+    temp_dir = tempfile.mkdtemp(prefix="lettuce_bench_")
+    xml_file = os.path.join(temp_dir, "catalog.xml")
+    syntheticScene.write_catalog(xml_file, size["catalog"], plates)
+
+    # The hair files exist on disk so import_hairMayaFile can stamp the sets and skip them the second time
+    project = os.path.join(temp_dir, "project")
+    syntheticScene.write_hair_files(project, size["characters"])
+
+    scene = fakeMaya.install(fakeMaya.FakeMaya(call_cost=call_cost, project=project))
+    syntheticScene.build_scene(scene,
+                               characters=size["characters"],
+                               references=size["references"],
+                               history=size["history"],
+                               plates=plates,
+                               hair_nodes=size["hair_nodes"]
+                               )
+    lxg.invalidate_reference_snapshot()
+
+    results = []
+    state = {}
+
+    def stage(stage_name, func):
+        scene.reset_counts()
+        start = time.time()
+        func()
+        seconds = time.time() - start
+        results.append({"size": name,
+                        "stage": stage_name,
+                        "seconds": seconds,
+                        "calls": scene.get_calls(),
+                        "commands": dict(scene.calls)
+                        })
+
+    try:
+        stage("generate_characters", lambda: state.update(catalog=lxg.generate_characters(xml_file)))
+        stage("get_scene_characters", lambda: state.update(characters=lxg.get_scene_characters(state["catalog"])))
+        stage("import_hairMayaFile", lambda: lxg.import_hairMayaFile(state["characters"], defer=False))
+        stage("wrap_hair_plates", lambda: [lxg.wrap_hair_plates(c, refresh=False) for c in state["characters"]])
+        stage("import_hairMayaFile (current)", lambda: lxg.import_hairMayaFile(state["characters"], defer=False))
+        stage("delete_set", lambda: [lxg.delete_set(lxg.get_hair_set_name(c)) for c in state["characters"]])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if len(state.get("characters", [])) != size["characters"]:
+        raise RuntimeError("Found {0} of {1} scene characters".format(len(state.get("characters", [])),
+                                                                      size["characters"]))
+    return results
+
+
+def format_commands(commands):
+    top = sorted(commands.items(), key=lambda c: (-c[1], c[0]))[:TOP_COMMANDS]
+    return ", ".join("{0} {1}".format(c, n) for c, n in top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times the lettuce pipeline on synthetic scenes without Maya")
+    parser.add_argument("--sizes", nargs="+", choices=SIZE_ORDER, default=list(SIZE_ORDER), help="Scene sizes to run")
+    parser.add_argument("--call-cost", type=float, default=0.0, help="Microseconds charged per Maya command")
+    parser.add_argument("--json", dest="json_file", help="Also writes the results to this JSON file")
+    parser.add_argument("--trace", dest="trace_file", help="Traces the runs with lettuceTrace into this Chrome trace")
+    args = parser.parse_args(argv)
+
+    # The pipeline logs every step, only the cost of the calls themselves is of interest here
+    logging.getLogger("lettuce").addHandler(logging.NullHandler())
+    logging.getLogger("lettuce").setLevel(logging.ERROR)
+
+    if args.trace_file:
+        lettuceTrace.enable()
+
+    results = []
+    for name in args.sizes:
+        results.extend(run_size(name, SIZES[name], args.call_cost / 1e6))
+
+    tracer = lettuceTrace.disable()
+    if tracer is not None:
+        tracer.write_chrome_trace(args.trace_file)
+        print(tracer.summary())
+        print("")
+
+    print("{0:<8} {1:<30} {2:>10} {3:>8}  {4}".format("size", "stage", "seconds", "calls", "top commands"))
+    for r in results:
+        print("{0:<8} {1:<30} {2:>10.4f} {3:>8}  {4}".format(r["size"],
+                                                             r["stage"],
+                                                             r["seconds"],
+                                                             r["calls"],
+                                                             format_commands(r["commands"])
+                                                             ))
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
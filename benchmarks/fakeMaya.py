@@ -0,0 +1,438 @@
+import os
+import sys
+import time
+import types
+import collections
+
+# An in-memory stand-in for the maya.cmds and maya.mel commands lettuce uses, so the pipeline can be run and timed
+# without Maya:
+#
+#   import fakeMaya
+#   scene = fakeMaya.install(fakeMaya.FakeMaya(call_cost=0.0001))
+#
+# install puts maya, maya.cmds and maya.mel modules into sys.modules whose commands run on the active FakeMaya.  The
+# scene models nodes, their types and attributes, sets, references and mesh history, which is enough for xgenSetup and
+# rr_wrap.  Every command is counted and charged call_cost seconds of busy waiting, a rough stand-in for the fixed
+# cost of a real Maya command.  Only the flags lettuce passes are understood.
+
+# The maya.cmds commands the stand-in provides
+COMMANDS = ("about",
+            "addAttr",
+            "attributeQuery",
+            "connectAttr",
+            "deformer",
+            "delete",
+            "deleteUI",
+            "duplicate",
+            "file",
+            "getAttr",
+            "hide",
+            "listHistory",
+            "listRelatives",
+            "lockNode",
+            "ls",
+            "nodeType",
+            "objExists",
+            "progressBar",
+            "referenceQuery",
+            "refresh",
+            "scriptJob",
+            "setAttr",
+            "sets",
+            "workspace",
+            )
+
+_active = None
+
+# **********************************************************************************************************************
+#                                                      FakeNode
+# **********************************************************************************************************************
+
+
+class FakeNode(object):
+    __slots__ = ("name", "type", "attrs", "reference", "locked", "members", "history", "shapes", "text")
+
+    def __init__(self, name, node_type, attrs=None, reference=None):
+        self.name = name
+        self.type = node_type
+        self.attrs = dict(attrs or {})
+
+        # The reference node the node was loaded from, None for nodes created in the scene
+        self.reference = reference
+        self.locked = False
+
+        # objectSet members, upstream history and shape children, by node name
+        self.members = []
+        self.history = []
+        self.shapes = []
+        self.text = ""
+
+    def __repr__(self):
+        return "<FakeNode {0} ({1})>".format(self.name, self.type)
+
+# **********************************************************************************************************************
+#                                                    FakeReference
+# **********************************************************************************************************************
+
+
+class FakeReference(object):
+    def __init__(self, node, filename, namespace, loaded=True):
+        self.node = node
+        self.filename = filename
+        self.namespace = namespace
+        self.loaded = loaded
+
+        # Names of the nodes the reference brought in
+        self.nodes = []
+
+# **********************************************************************************************************************
+#                                                      FakeMaya
+# **********************************************************************************************************************
+
+
+class FakeMaya(object):
+    def __init__(self, call_cost=0.0, project="/projects/fake", scene_name="/projects/fake/scenes/shot.ma"):
+        """
+        :param call_cost: Seconds every command busy waits, models Maya's per command overhead
+        :param project: The workspace root directory
+        :param scene_name: The file name of the open scene
+        """
+        self.call_cost = call_cost
+        self.project = project
+        self.scene_name = scene_name
+
+        self.nodes = collections.OrderedDict()
+        self.references = collections.OrderedDict()
+        self.connections = []
+
+        # File path to a function(scene, namespace, reference) returning the names of the nodes the file creates
+        self.files = {}
+
+        self.calls = collections.Counter()
+        self.seconds = 0.0
+
+    # ---------------------------------------------------
+    #                     Scene Setup
+    # ---------------------------------------------------
+
+    def create_node(self, name, node_type, attrs=None, reference=None):
+        """
+        Adds a node, renamed with a trailing number when the name is taken, like Maya does
+        :return: The node's name
+        """
+        unique = name
+        i = 1
+        while unique in self.nodes:
+            unique = "{0}{1}".format(name, i)
+            i += 1
+
+        self.nodes[unique] = FakeNode(unique, node_type, attrs, reference)
+        if reference is not None:
+            self.references[reference].nodes.append(unique)
+        return unique
+
+    def create_reference(self, filename, namespace, loaded=True):
+        """
+        Adds a reference node, its nodes are added with create_node(..., reference=<the returned name>)
+        :return: The reference node's name
+        """
+        node = self.create_node("{}RN".format(namespace), "reference")
+        self.references[node] = FakeReference(node, filename, namespace, loaded)
+        return node
+
+    def register_file(self, path, builder):
+        """
+        Makes a file available to mc.file imports and references
+        :param path: The path as lettuce will pass it
+        :param builder: A function(scene, namespace, reference) that creates the file's nodes and returns their names
+        """
+        self.files[path] = builder
+
+    def reset_counts(self):
+        self.calls = collections.Counter()
+        self.seconds = 0.0
+
+    def get_calls(self):
+        return sum(self.calls.values())
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def charge(self, command):
+        """ Counts a command and busy waits its cost, time.sleep is too coarse for sub millisecond costs """
+        self.calls[command] += 1
+        if self.call_cost > 0:
+            end = time.time() + self.call_cost
+            while time.time() < end:
+                pass
+            self.seconds += self.call_cost
+
+    def _node(self, name):
+        node = self.nodes.get(name)
+        if node is None:
+            raise ValueError("No object matches name: {}".format(name))
+        return node
+
+    def _split_plug(self, plug):
+        node, attr = plug.split(".", 1)
+        return self._node(node), attr
+
+    def _reference_of(self, name):
+        # A reference node, a referenced node or a referenced file
+        if name in self.references:
+            return self.references[name]
+        if name in self.nodes:
+            ref = self.nodes[name].reference
+            if ref is None:
+                raise RuntimeError("'{}' is not from a referenced file".format(name))
+            return self.references[ref]
+        for ref in self.references.values():
+            if ref.filename == name:
+                return ref
+        raise RuntimeError("'{}' is not a reference".format(name))
+
+    def _remove(self, name):
+        node = self.nodes.pop(name, None)
+        if node is None:
+            return
+        for s in node.shapes:
+            self._remove(s)
+        if node.reference is not None and node.reference in self.references:
+            ref_nodes = self.references[node.reference].nodes
+            if name in ref_nodes:
+                ref_nodes.remove(name)
+
+    def _load_file(self, path, namespace, reference):
+        builder = self.files.get(path)
+        if builder is None and os.path.isabs(path):
+            # Files are registered project relative, references are made to their full path in the project
+            builder = self.files.get(os.path.relpath(path, self.project).replace(os.sep, "/"))
+        if builder is None:
+            raise RuntimeError("File not found: {}".format(path))
+        return builder(self, namespace, reference)
+
+    # ---------------------------------------------------
+    #                      Commands
+    # ---------------------------------------------------
+
+    def about(self, batch=False, **kwargs):
+        return True
+
+    def addAttr(self, node, longName=None, ln=None, sn=None, **kwargs):
+        n = self._node(node)
+        for name in (longName or ln, sn):
+            if name:
+                n.attrs.setdefault(name, kwargs.get("dv", kwargs.get("defaultValue")))
+
+    def attributeQuery(self, attr, node=None, n=None, exists=False, **kwargs):
+        return attr in self._node(node or n).attrs
+
+    def connectAttr(self, source, destination, **kwargs):
+        self.connections.append((source, destination))
+
+    def deformer(self, surface, type=None, **kwargs):
+        self._node(surface)
+        node = self.create_node(type, type, {"envelope": 1.0})
+        return [node]
+
+    def delete(self, nodes, **kwargs):
+        if isinstance(nodes, basestring):
+            nodes = [nodes]
+        for name in nodes:
+            self._node(name)
+        for name in nodes:
+            self._remove(name)
+
+    def deleteUI(self, *args, **kwargs):
+        pass
+
+    def duplicate(self, node, name=None, **kwargs):
+        source = self._node(node)
+        copy = self.create_node(name or node, source.type, source.attrs)
+        for s in source.shapes:
+            shape = self.create_node(copy + "Shape", self.nodes[s].type, self.nodes[s].attrs)
+            self.nodes[copy].shapes.append(shape)
+        return [copy]
+
+    def file(self, *args, **kwargs):
+        if kwargs.get("q") or kwargs.get("query"):
+            return self.scene_name
+        if kwargs.get("save"):
+            return self.scene_name
+        if kwargs.get("open"):
+            return self.scene_name
+        if kwargs.get("loadReference"):
+            ref = self.references[kwargs["loadReference"]]
+            if not ref.loaded:
+                ref.loaded = True
+                self._load_file(ref.filename, ref.namespace, ref.node)
+            return ref.filename
+        if kwargs.get("removeReference"):
+            ref = self.references.pop(kwargs["referenceNode"], None)
+            if ref is None:
+                raise RuntimeError("Reference not found: {}".format(kwargs["referenceNode"]))
+            for name in list(ref.nodes):
+                self._remove(name)
+            self._remove(ref.node)
+            return None
+        if kwargs.get("reference"):
+            path = args[0]
+            namespace = kwargs.get("namespace", ":").strip(":")
+            ref = self.create_reference(path, namespace or "hair", loaded=not kwargs.get("deferReference"))
+            self.references[ref].namespace = namespace
+            if self.references[ref].loaded:
+                self._load_file(path, namespace, ref)
+            return path
+        if kwargs.get("i"):
+            return self._load_file(args[0], "", None)
+        raise RuntimeError("Unsupported file flags: {}".format(sorted(kwargs)))
+
+    def getAttr(self, plug, **kwargs):
+        node, attr = self._split_plug(plug)
+        if attr not in node.attrs:
+            raise ValueError("No attribute: {}".format(plug))
+        return node.attrs[attr]
+
+    def hide(self, *args, **kwargs):
+        pass
+
+    def listHistory(self, node, **kwargs):
+        return [node] + list(self._node(node).history)
+
+    def listRelatives(self, node, shapes=False, **kwargs):
+        return list(self._node(node).shapes) or None
+
+    def lockNode(self, node, query=False, lock=None, **kwargs):
+        n = self._node(node)
+        if query:
+            return [n.locked]
+        n.locked = bool(lock)
+
+    def ls(self, *args, **kwargs):
+        if kwargs.get("references"):
+            return list(self.references)
+
+        names = []
+        for a in args:
+            if isinstance(a, basestring):
+                names.append(a)
+            else:
+                names.extend(a)
+
+        found = []
+        for name in names:
+            if "." in name:
+                node = self.nodes.get(name.split(".", 1)[0])
+                if node is not None and name.split(".", 1)[1] in node.attrs:
+                    found.append(name)
+            elif name in self.nodes:
+                found.append(name)
+
+        node_type = kwargs.get("type")
+        if node_type is not None:
+            found = [n for n in found if "." not in n and self.nodes[n].type == node_type]
+        if kwargs.get("referencedNodes"):
+            found = [n for n in found if "." not in n and self.nodes[n].reference is not None]
+        if kwargs.get("showType"):
+            typed = []
+            for n in found:
+                typed.extend([n, self.nodes[n.split(".", 1)[0]].type])
+            return typed
+        return found
+
+    def nodeType(self, node, **kwargs):
+        return self._node(node).type
+
+    def objExists(self, name):
+        if "." in name:
+            node = self.nodes.get(name.split(".", 1)[0])
+            return node is not None and name.split(".", 1)[1] in node.attrs
+        return name in self.nodes
+
+    def progressBar(self, *args, **kwargs):
+        return False
+
+    def referenceQuery(self, node, filename=False, namespace=False, referenceNode=False, isLoaded=False, **kwargs):
+        ref = self._reference_of(node)
+        if filename:
+            return ref.filename
+        if namespace:
+            return ":" + ref.namespace
+        if referenceNode:
+            return ref.node
+        if isLoaded:
+            return ref.loaded
+        raise RuntimeError("Unsupported referenceQuery flags")
+
+    def refresh(self, **kwargs):
+        pass
+
+    def scriptJob(self, **kwargs):
+        return 1
+
+    def setAttr(self, plug, *args, **kwargs):
+        node, attr = self._split_plug(plug)
+        if args:
+            node.attrs[attr] = args[0]
+
+    def sets(self, *args, **kwargs):
+        if kwargs.get("query") or kwargs.get("q"):
+            members = [m for m in self._node(args[0]).members if m in self.nodes]
+            return members or None
+        name = self.create_node(kwargs.get("name", "set"), "objectSet")
+        members = args[0] if args else []
+        if isinstance(members, basestring):
+            members = [members]
+        self.nodes[name].members = list(members)
+        self.nodes[name].text = kwargs.get("text", "")
+        return name
+
+    def workspace(self, *args, **kwargs):
+        if kwargs.get("q") or kwargs.get("query"):
+            return self.project
+        if args:
+            self.project = args[0]
+
+
+def _command(name):
+    def command(*args, **kwargs):
+        _active.charge(name)
+        return getattr(_active, name)(*args, **kwargs)
+
+    command.__name__ = name
+    return command
+
+
+def install(scene=None):
+    """
+    Makes scene the Maya that maya.cmds and maya.mel talk to, creating the stand-in modules on first use
+    :param scene: A FakeMaya, a new empty one by default
+    :return: The active FakeMaya
+    """
+    global _active
+
+    _active = scene or FakeMaya()
+
+    if not getattr(sys.modules.get("maya"), "lettuce_fake", False):
+        maya = types.ModuleType("maya")
+        maya.lettuce_fake = True
+
+        cmds = types.ModuleType("maya.cmds")
+        for name in COMMANDS:
+            setattr(cmds, name, _command(name))
+
+        mel = types.ModuleType("maya.mel")
+        mel.eval = lambda script: ""
+
+        maya.cmds = cmds
+        maya.mel = mel
+        sys.modules["maya"] = maya
+        sys.modules["maya.cmds"] = cmds
+        sys.modules["maya.mel"] = mel
+
+    return _active
+
+
+def get_active():
+    return _active
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+
+# Runs lettuceScheduler over synthetic scenes with plain python workers and the stand-in maya package in standin/, and
+# checks that timeouts, crash retries and the aggregated result log behave:
+#
+#   python benchmarks/schedulerCheck.py --timeout 5
+#
+# Exits 0 when every scene ends with the expected status after the expected number of attempts.
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+import syntheticScene
+import lettuceBatch
+import lettuceScheduler
+
+# Scene name, write_scene_file arguments, expected status and attempts with one retry
+CASES = (("ok", {}, lettuceBatch.OK, 1),
+         ("no_characters", {"characters": 0}, lettuceBatch.NO_CHARACTERS, 1),
+         ("crash_once", {"crash": "once"}, lettuceBatch.OK, 2),
+         ("crash", {"crash": "always"}, lettuceScheduler.CRASHED, 2),
+         ("hang", {"hang": 600}, lettuceScheduler.TIMEOUT, 2),
+         )
+
+CHARACTERS = 2
+
+
+def get_worker_env():
+    """ The environment of a worker running on the stand-in maya package """
+    return {"PYTHONPATH": os.pathsep.join([os.path.join(BENCHMARKS, "standin"), BENCHMARKS]),
+            # The stand-in only knows the hair files by their project path
+            "LETTUCE_CACHE_ASSETS": "0",
+            "LETTUCE_MIRROR_ENABLED": "0"
+            }
+
+
+def check_jobs(jobs, cases):
+    """
+    Compares the jobs of a run with the expected outcomes
+    :param jobs: The SceneJobs returned by Scheduler.run
+    :param cases: The CASES entries the scenes were written from, in the same order
+    :return: A list of failure messages
+    """
+    failures = []
+    for (name, spec, status, attempts), job in zip(cases, jobs):
+        if job.get_status() != status or job.attempts != attempts:
+            failures.append("{0}: {1} after {2} attempts, expected {3} after {4}".format(name, job.get_status(),
+                                                                                       job.attempts, status, attempts))
+        if not job.log_file or not os.path.isfile(job.log_file):
+            failures.append("{}: no worker log".format(name))
+
+        report = job.get_report()
+        if status == lettuceBatch.OK and (report is None or len(report["wrapped"]) != CHARACTERS):
+            failures.append("{0}: expected {1} wrapped characters, report {2}".format(name, CHARACTERS, report))
+    return failures
+
+
+def check_result_log(jobs, log_file):
+    """
+    Writes the aggregated result log like lettuceScheduler.main and reads it back
+    :return: A list of failure messages
+    """
+    with open(log_file, "w") as f:
+        json.dump(lettuceScheduler.aggregate(jobs), f, indent=2)
+    with open(log_file, "r") as f:
+        result = json.load(f)
+
+    failures = []
+    if sum(result["summary"].values()) != len(jobs):
+        failures.append("result log summary counts {0} of {1} jobs".format(sum(result["summary"].values()), len(jobs)))
+    if [j["scene"] for j in result["jobs"]] != [j.get_scene() for j in jobs]:
+        failures.append("result log jobs are out of order")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checks lettuceScheduler with stand-in maya workers")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds allowed per scene attempt")
+    parser.add_argument("--workers", type=int, default=3, help="Concurrent worker processes")
+    parser.add_argument("--keep", action="store_true", help="Keeps the temp folder with the worker logs")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("lettuce").addHandler(logging.StreamHandler(sys.stderr))
+    logging.getLogger("lettuce").setLevel(logging.WARNING)
+
+    temp_dir = tempfile.mkdtemp(prefix="lettuce_scheduler_")
+    project = os.path.join(temp_dir, "project")
+    xml_file = os.path.join(temp_dir, "catalog.xml")
+
+    syntheticScene.write_catalog(xml_file, CHARACTERS)
+    syntheticScene.write_hair_files(project, CHARACTERS)
+
+    scenes = []
+    for name, spec, status, attempts in CASES:
+        scene_file = os.path.join(temp_dir, "scenes", name + ".ma")
+        if not os.path.isdir(os.path.dirname(scene_file)):
+            os.makedirs(os.path.dirname(scene_file))
+        kwargs = dict(characters=CHARACTERS)
+        kwargs.update(spec)
+        syntheticScene.write_scene_file(scene_file, **kwargs)
+        scenes.append(scene_file)
+
+    failures = []
+    try:
+        for mode in ("import", "reference"):
+            scheduler = lettuceScheduler.Scheduler(workers=args.workers,
+                                                   timeout=args.timeout,
+                                                   retries=1,
+                                                   python=sys.executable,
+                                                   batch_args=["--xml", xml_file,
+                                                               "--project", project,
+                                                               "--mode", mode,
+                                                               "--log-level", "WARNING"
+                                                               ],
+                                                   env=get_worker_env(),
+                                                   work_dir=os.path.join(temp_dir, "work_" + mode),
+                                                   poll_interval=0.1
+                                                   )
+
+            # The crash once markers are left by the previous run
+            for scene_file in scenes:
+                if os.path.exists(scene_file + ".crashed"):
+                    os.remove(scene_file + ".crashed")
+
+            jobs = scheduler.run(scenes)
+            mode_failures = check_jobs(jobs, CASES)
+            mode_failures += check_result_log(jobs, os.path.join(temp_dir, "result_{}.json".format(mode)))
+
+            print("{0:<10} {1}".format(mode, dict(lettuceScheduler.summarize(jobs))))
+            failures += ["{0} {1}".format(mode, f) for f in mode_failures]
+    finally:
+        if args.keep:
+            print("Kept: {}".format(temp_dir))
+        else:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for f in failures:
+        print("FAILED {}".format(f))
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# A stand-in maya package, so lettuce worker processes run in a plain python without Maya:
+#
+#   Scheduler(python=sys.executable, env={"PYTHONPATH": os.pathsep.join(["benchmarks/standin", "benchmarks"])})
+#
+# maya.cmds runs its commands on fakeMaya, scene files are the JSON descriptions written by
+# syntheticScene.write_scene_file and are built into a fresh fakeMaya scene when they are opened.
+
+# Tells fakeMaya.install to leave these modules in place
+lettuce_fake = True
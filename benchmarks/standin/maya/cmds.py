@@ -0,0 +1,50 @@
+import os
+import time
+
+import fakeMaya
+import syntheticScene
+
+# Exit code of a worker told to crash by its scene file
+CRASH_CODE = 3
+
+for _name in fakeMaya.COMMANDS:
+    globals()[_name] = fakeMaya._command(_name)
+
+_file = fakeMaya._command("file")
+
+fakeMaya.install()
+
+
+def file(*args, **kwargs):
+    if kwargs.get("open"):
+        return open_scene(args[0])
+    return _file(*args, **kwargs)
+
+
+def open_scene(scene_file):
+    """
+    Builds the synthetic scene a scene file describes as the active fakeMaya scene, in the current project
+    :param scene_file: A file written by syntheticScene.write_scene_file
+    :return: scene_file
+    """
+    spec = syntheticScene.read_scene_file(scene_file)
+
+    if spec.get("hang"):
+        time.sleep(spec["hang"])
+
+    # A crash once leaves a marker, so the retry gets through
+    marker = scene_file + ".crashed"
+    if spec.get("crash") == "always" or (spec.get("crash") == "once" and not os.path.exists(marker)):
+        open(marker, "w").close()
+        os._exit(CRASH_CODE)
+
+    project = fakeMaya.get_active().project
+    scene = fakeMaya.install(fakeMaya.FakeMaya(project=project, scene_name=scene_file))
+    syntheticScene.build_scene(scene,
+                               characters=spec["characters"],
+                               references=spec["references"],
+                               history=spec["history"],
+                               plates=spec["plates"],
+                               hair_nodes=spec["hair_nodes"]
+                               )
+    return scene_file
@@ -0,0 +1,2 @@
+def eval(script):
+    return ""
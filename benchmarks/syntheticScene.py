@@ -0,0 +1,169 @@
+import os
+import json
+
+# Synthetic character catalogs and fakeMaya scenes for the benchmarks.  Character i of a catalog is named char<i>, its
+# mesh is referenced from assets/characters/char<i>/Maya Files/ and its hair file imports <plates> hair plates plus
+# <hair_nodes> other nodes.
+
+CHARACTER_XML = """	<character name="char{0}" altName="Character {0}" >
+		<collection version="default">
+			<mayaFile>{1}</mayaFile>
+			<xgenFile>{5}</xgenFile>
+{2}		</collection>
+		<mayaObject version="default">
+			<mayaFile>{3}</mayaFile>
+			<characterMesh>{4}</characterMesh>
+		</mayaObject>
+	</character>
+"""
+
+# Mesh history node types, in the order they are cycled through.  The deformers carry an envelope.
+HISTORY_TYPES = (("skinCluster", True),
+                 ("tweak", True),
+                 ("joint", False),
+                 ("blendShape", True),
+                 ("animCurveUU", False),
+                 ("groupParts", False),
+                 ("groupId", False),
+                 )
+
+
+def get_hair_file(index):
+    return "assets/characters/char{0}/xgen/char{0}_production_xgen.ma".format(index)
+
+
+def get_mesh_file(index):
+    return "assets/characters/char{0}/Maya Files/char{0}_production_model.ma".format(index)
+
+
+def get_mesh_name(index):
+    return "char{}_body_mesh".format(index)
+
+
+def get_plate_names(index, plates):
+    return ["char{0}_plate{1}".format(index, j) for j in range(plates)]
+
+
+def write_catalog(xml_file, characters, plates=2):
+    """
+    Writes a synthetic character xml file
+    :param xml_file: The file to write
+    :param characters: The number of characters in it
+    :param plates: Hair plates per character
+    :return: Nothing
+    """
+    with open(xml_file, "w") as f:
+        f.write("<?xml version='1.0' encoding='us-ascii'?>\n<lettuce>\n")
+        for i in range(characters):
+            plate_xml = "".join("\t\t\t<hairPlate>{}</hairPlate>\n".format(p) for p in get_plate_names(i, plates))
+            f.write(CHARACTER_XML.format(i, get_hair_file(i), plate_xml, get_mesh_file(i), get_mesh_name(i),
+                                         get_xgen_file(i)))
+        f.write("</lettuce>\n")
+
+
+def get_xgen_file(index):
+    return "assets/characters/char{0}/xgen/char{0}_production_xgen__char{0}_collect.xgen".format(index)
+
+
+def write_hair_files(project, characters):
+    """
+    Creates empty hair and xgen files for characters 0 to characters - 1 under project, so their hair sets can be
+    stamped and their descriptions copied
+    :param project: The folder standing in for the maya project
+    :param characters: The number of characters
+    :return: Nothing
+    """
+    for i in range(characters):
+        for f in (get_hair_file(i), get_xgen_file(i)):
+            path = os.path.join(project, f)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+
+
+def write_scene_file(scene_file, characters=2, references=10, history=50, plates=2, hair_nodes=20, hang=0,
+                     crash=None):
+    """
+    Writes a scene file for the stand-in maya package in benchmarks/standin, a JSON description of a synthetic scene
+    that build_scene creates when the file is opened
+    :param scene_file: The file to write
+    :param characters: As for build_scene
+    :param references: As for build_scene
+    :param history: As for build_scene
+    :param plates: As for build_scene
+    :param hair_nodes: As for build_scene
+    :param hang: Seconds opening the scene sleeps, to trigger a worker timeout
+    :param crash: "once" or "always" to make the worker process exit when it opens the scene
+    :return: Nothing
+    """
+    spec = {"characters": characters,
+            "references": references,
+            "history": history,
+            "plates": plates,
+            "hair_nodes": hair_nodes,
+            "hang": hang,
+            "crash": crash
+            }
+    with open(scene_file, "w") as f:
+        json.dump(spec, f)
+
+
+def read_scene_file(scene_file):
+    with open(scene_file, "r") as f:
+        return json.load(f)
+
+
+def build_scene(scene, characters=5, references=100, history=500, plates=2, hair_nodes=50):
+    """
+    Fills a fakeMaya.FakeMaya with referenced characters, unrelated prop references and mesh history, and registers the
+    characters' hair files
+    :param scene: An empty FakeMaya
+    :param characters: Characters 0 to characters - 1 of the catalog are referenced into the scene
+    :param references: The total number of references, the ones beyond the characters are props
+    :param history: History nodes, spread over the character meshes
+    :param plates: Hair plates per character, must match the catalog
+    :param hair_nodes: Nodes besides the plates that each hair file creates
+    :return: The scene
+    """
+    per_character = history // max(1, characters)
+
+    for i in range(characters):
+        namespace = "char{}".format(i)
+        ref = scene.create_reference("{0}/{1}".format(scene.project, get_mesh_file(i)), namespace)
+
+        mesh = scene.create_node("{0}:{1}".format(namespace, get_mesh_name(i)), "transform", reference=ref)
+        for suffix in ("Shape", "ShapeDeformed", "ShapeOrig"):
+            shape = scene.create_node(mesh + suffix, "mesh", reference=ref)
+            scene.nodes[mesh].shapes.append(shape)
+
+        for h in range(per_character):
+            node_type, deformer = HISTORY_TYPES[h % len(HISTORY_TYPES)]
+            attrs = {"envelope": 1.0} if deformer else {}
+            node = scene.create_node("{0}:{1}{2}".format(namespace, node_type, h), node_type, attrs, reference=ref)
+            scene.nodes[mesh].history.append(node)
+
+        scene.register_file(get_hair_file(i), _hair_builder(i, plates, hair_nodes))
+
+    for i in range(max(0, references - characters)):
+        namespace = "prop{}".format(i)
+        ref = scene.create_reference("{0}/assets/props/prop{1}.ma".format(scene.project, i), namespace)
+        scene.create_node("{}:geo".format(namespace), "transform", reference=ref)
+
+    return scene
+
+
+def _hair_builder(index, plates, hair_nodes):
+    def build(scene, namespace, reference):
+        prefix = namespace + ":" if namespace else ""
+        names = []
+        for p in get_plate_names(index, plates):
+            plate = scene.create_node(prefix + p, "transform", reference=reference)
+            shape = scene.create_node(plate + "Shape", "mesh", reference=reference)
+            scene.nodes[plate].shapes.append(shape)
+            names.extend([plate, shape])
+        for k in range(hair_nodes):
+            names.append(scene.create_node("{0}char{1}_hair{2}".format(prefix, index, k), "xgmDescription",
+                                           reference=reference))
+        return names
+
+    return build
@@ -0,0 +1,227 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import traceback
+
+# Headless entry point, runs the hair setup pipeline over many scenes without the UI:
+#
+#   mayapy lettuceBatch.py --report report.json shots/sq010/*.ma
+#
+# Every scene is opened, its characters found, their descriptions copied, hair imported and wrapped, then the scene is
+# saved.  A JSON report with one entry per scene is written to --report, or printed when it is omitted.
+
+mlg = logging.getLogger("lettuce.lettuceBatch")
+
+OK = "ok"
+FAILED = "failed"
+NO_CHARACTERS = "no_characters"
+
+
+def expand_scenes(patterns, list_file=None):
+    """
+    Expands scene paths and globs, shells on windows do not expand them for us
+    :param patterns: A list of scene paths or glob patterns
+    :param list_file: An optional text file with one scene path or pattern per line
+    :return: A list of scene files, in the given order and without duplicates
+    """
+    patterns = list(patterns)
+
+    if list_file is not None:
+        with open(list_file, "r") as f:
+            patterns.extend(l.strip() for l in f if l.strip() and not l.startswith("#"))
+
+    scenes = []
+    for p in patterns:
+        matches = sorted(glob.glob(p)) or [p]
+        for m in matches:
+            if m not in scenes:
+                scenes.append(m)
+    return scenes
+
+
+def process_scene(scene_file, catalog, save=True, mode="import", config=None):
+    """
+    Runs get_scene_characters, copy_xgen_files, import_hairMayaFile and wrap_hair_plates on a scene, then saves it
+    :param scene_file: A path to a maya scene
+    :param catalog: The CharacterCatalog to match the scene against
+    :param save: Saves the scene when the setup succeeded
+    :param mode: xgenSetup.IMPORT or xgenSetup.REFERENCE, references are loaded right away so they can be wrapped
+    :param config: A lettuceConfig.Configuration, used to update the project mirror with the scene's collections
+    :return: A dict report of what was done to the scene
+    """
+    import maya.cmds as mc
+    import xgenSetup as lxg
+
+    start = time.time()
+    report = {"scene": scene_file,
+              "status": OK,
+              "characters": [],
+              "copied": [],
+              "skipped": [],
+              "copy_failed": [],
+              "imported": [],
+              "current": [],
+              "wrapped": [],
+              "errors": [],
+              "saved": False,
+              "seconds": 0.0
+              }
+
+    try:
+        mlg.info("Opening scene: %s", scene_file)
+        mc.file(scene_file, open=True, force=True, ignoreVersion=True)
+        lxg.invalidate_reference_snapshot()
+
+        characters = lxg.get_scene_characters(catalog)
+        report["characters"] = [c.get_charName() for c in characters]
+
+        if not characters:
+            mlg.info("No characters in scene: %s", scene_file)
+            report["status"] = NO_CHARACTERS
+            return report
+
+        if config is not None:
+            lxg.sync_project_mirror(config, characters)
+
+        copy_report = lxg.copy_xgen_files(characters)
+        report["copied"] = [j.get_src() for j in copy_report.get_copied()]
+        report["skipped"] = [j.get_src() for j in copy_report.get_skipped()]
+        report["copy_failed"] = [j.get_src() for j in copy_report.get_failed()]
+        for j in copy_report.get_failed():
+            report["errors"].append("copy {0}: {1}".format(j.get_src(), j.get_error()))
+
+        set_packages = lxg.import_hairMayaFile(characters, mode=mode, defer=False)
+        report["imported"] = [p.get_name() for p in set_packages if p.is_updated()]
+        report["current"] = [p.get_name() for p in set_packages if not p.is_updated()]
+
+        for c in characters:
+            # Hair that was already current keeps its existing wraps
+            if lxg.get_hair_set_name(c) not in report["imported"]:
+                continue
+            try:
+                lxg.wrap_hair_plates(c, refresh=False)
+                report["wrapped"].append(c.get_charName())
+            except Exception as e:
+                mlg.error("Unable to wrap hair plates for %s.  Error: %s", c.get_charName(), e)
+                report["errors"].append("wrap {0}: {1}".format(c.get_charName(), e))
+
+        if report["errors"]:
+            report["status"] = FAILED
+
+        if save and report["status"] == OK:
+            mc.file(save=True, force=True)
+            report["saved"] = True
+            mlg.info("Saved scene: %s", scene_file)
+
+    except Exception as e:
+        mlg.error("Scene failed, %s.  Error: %s", scene_file, e)
+        mlg.debug("Traceback for %s", scene_file, exc_info=True)
+        report["status"] = FAILED
+        report["errors"].append(traceback.format_exc())
+
+    finally:
+        report["seconds"] = time.time() - start
+
+    return report
+
+
+def run(scenes, xml_file=None, project=None, save=True, mode=None):
+    """
+    Processes every scene in turn with the configured character catalog
+    :param scenes: A list of scene files
+    :param xml_file: The character xml file, defaults to the configured one
+    :param project: The maya project to work in, defaults to the configured one
+    :param save: Saves each scene that was set up successfully
+    :param mode: How hair is brought in, xgenSetup.IMPORT or xgenSetup.REFERENCE, defaults to the configured one
+    :return: A list of per scene report dicts
+    """
+    import maya.cmds as mc
+    import lettuceConfig
+    import xgenSetup as lxg
+    from lettuceCache import AssetCache
+
+    config = lettuceConfig.get_configuration()
+
+    if xml_file is None:
+        xml_file = config.get_xml_file()
+    if project is None:
+        project = config.get_server_project()
+    if mode is None:
+        mode = config.get_hair_mode()
+
+    mlg.info("Project: %s", project)
+    mc.workspace(project, openWorkspace=True)
+
+    if config.get_asset_cache():
+        lxg.set_asset_cache(AssetCache(max_bytes=config.get_asset_cache_limit()))
+
+    if config.get_mirror():
+        lxg.set_asset_root(config.get_project())
+        config.sync_mirror()
+
+    catalog = lxg.load_characters(xml_file, use_hash=config.get_cache_hash())
+
+    reports = []
+    for i, scene in enumerate(scenes):
+        mlg.info("Scene %s of %s: %s", i + 1, len(scenes), scene)
+        reports.append(process_scene(scene, catalog, save=save, mode=mode, config=config))
+
+    return reports
+
+
+def initialize_standalone():
+    """ Starts maya.standalone when running under mayapy, does nothing inside an interactive Maya """
+    import maya.standalone
+    try:
+        maya.standalone.initialize(name="python")
+    except RuntimeError:
+        # Already initialized
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sets up lettuce hair on maya scenes without the UI")
+    parser.add_argument("scenes", nargs="*", help="Scene files or glob patterns")
+    parser.add_argument("--list", dest="list_file", help="A text file with one scene or pattern per line")
+    parser.add_argument("--xml", dest="xml_file", help="The character xml file, defaults to the configured one")
+    parser.add_argument("--project", help="The maya project, defaults to the configured one")
+    parser.add_argument("--report", help="Writes the JSON report to this file instead of stdout")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="Leaves the scenes unsaved")
+    parser.add_argument("--mode", choices=["import", "reference"], help="Imports or references the hair files")
+    parser.add_argument("--log-level", default="INFO", help="Logging level for stderr")
+    args = parser.parse_args(argv)
+
+    lg = logging.getLogger("lettuce")
+    lg.setLevel(getattr(logging, args.log_level.upper(), logging.INFO))
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s.%(funcName)s - %(levelname)s - %(message)s"))
+    lg.addHandler(handler)
+
+    scenes = expand_scenes(args.scenes, args.list_file)
+    if not scenes:
+        parser.error("No scenes given")
+
+    initialize_standalone()
+
+    reports = run(scenes, xml_file=args.xml_file, project=args.project, save=args.save, mode=args.mode)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+    else:
+        json.dump(reports, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    failed = [r for r in reports if r["status"] == FAILED]
+    mlg.info("%s scenes processed, %s failed", len(reports), len(failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Makes the sibling lettuce modules importable when run as a script
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,450 @@
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# The catalog cache keeps a pickled copy of the parsed character catalog on local disk.  The network xml is only
+# stat'ed (and optionally hashed) on load, it is re-parsed when its mtime, size or hash no longer match the cache.
+#
+# The asset cache keeps content addressed local copies of the collection .ma and .xgen files.  A server file is only
+# downloaded again when its mtime or size changes, identical files share one local copy and the least recently used
+# copies are evicted once the cache grows past its size limit.  The asset cache keeps no shared index, so processes
+# sharing it never overwrite each other's bookkeeping.
+#
+# Both caches live in the user's home, in a folder only the user can write to.  Cached catalogs are unpickled and
+# cached assets are imported into Maya, so a cache folder someone else could write to is refused, see private_dir.
+
+mlg = logging.getLogger("lettuce.lettuceCache")
+
+# Bump whenever the pickled classes change shape so stale blobs are not unpickled into new code
+CACHE_FORMAT = 1
+
+# Seconds after its last use a cached asset is safe from eviction
+EVICT_GRACE = 600
+
+
+class CatalogCache:
+    def __init__(self, cache_dir=None, use_hash=False):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+
+        self.cache_dir = cache_dir
+        self.use_hash = use_hash
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_cache_dir(self):
+        return self.cache_dir
+
+    def get_cache_file(self, xml_file):
+        key = key_hash(os.path.normcase(os.path.abspath(xml_file)))
+        return os.path.join(self.cache_dir, "catalog_{}.pkl".format(key))
+
+    # ---------------------------------------------------
+    #                       Methods
+    # ---------------------------------------------------
+
+    def load(self, xml_file, parse, force=False):
+        """
+        Returns the parsed catalog for xml_file, from the local cache when the source is unchanged
+        :param xml_file: A path to the character xml file
+        :param parse: A callable taking xml_file and returning the parsed catalog, used on a cache miss
+        :param force: Ignores any cached copy and re-parses the xml file
+        :return: The parsed catalog
+        """
+        private_dir(self.cache_dir)
+
+        stamp = self._stamp(xml_file)
+
+        if not force:
+            catalog = self._read(xml_file, stamp)
+            if catalog is not None:
+                mlg.info("Loaded catalog from cache: %s", self.get_cache_file(xml_file))
+                return catalog
+
+        mlg.info("Parsing catalog from source: %s", xml_file)
+        catalog = parse(xml_file)
+        self._write(xml_file, stamp, catalog)
+        return catalog
+
+    def invalidate(self, xml_file=None):
+        """
+        Removes the cached catalog for xml_file, or every cached catalog when no file is given
+        :param xml_file: A path to the character xml file, optional
+        :return: Nothing
+        """
+        if xml_file is not None:
+            cache_files = [self.get_cache_file(xml_file)]
+        elif os.path.isdir(self.cache_dir):
+            cache_files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                           if f.startswith("catalog_") and f.endswith(".pkl")]
+        else:
+            cache_files = []
+
+        for f in cache_files:
+            try:
+                os.remove(f)
+                mlg.info("Removed cached catalog: %s", f)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    mlg.warning("Unable to remove cached catalog, %s.  Error: %s", f, e)
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _stamp(self, xml_file):
+        st = os.stat(xml_file)
+        stamp = {"mtime": st.st_mtime,
+                 "size": st.st_size,
+                 "hash": None
+                 }
+        if self.use_hash:
+            stamp["hash"] = file_hash(xml_file)
+        return stamp
+
+    def _read(self, xml_file, stamp):
+        cache_file = self.get_cache_file(xml_file)
+
+        if not os.path.isfile(cache_file):
+            mlg.debug("No cached catalog for %s", xml_file)
+            return None
+
+        if not is_private(cache_file):
+            mlg.warning("Ignoring cached catalog, %s, it is writable by other users", cache_file)
+            return None
+
+        try:
+            with open(cache_file, "rb") as f:
+                blob = pickle.load(f)
+        except Exception as e:
+            # A truncated or incompatible cache is just a miss
+            mlg.warning("Unable to read cached catalog, %s.  Error: %s", cache_file, e)
+            return None
+
+        if blob.get("format") != CACHE_FORMAT:
+            mlg.debug("Cached catalog format mismatch")
+            return None
+
+        cached = blob.get("stamp", {})
+        if cached.get("mtime") != stamp["mtime"] or cached.get("size") != stamp["size"]:
+            mlg.debug("Cached catalog is stale: %s != %s", cached, stamp)
+            return None
+
+        if stamp["hash"] is not None and cached.get("hash") != stamp["hash"]:
+            mlg.debug("Cached catalog hash mismatch")
+            return None
+
+        return blob.get("catalog")
+
+    def _write(self, xml_file, stamp, catalog):
+        cache_file = self.get_cache_file(xml_file)
+        temp_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+
+        blob = {"format": CACHE_FORMAT,
+                "source": xml_file,
+                "stamp": stamp,
+                "catalog": catalog
+                }
+
+        try:
+            private_dir(self.cache_dir)
+            with open(temp_file, "wb") as f:
+                pickle.dump(blob, f, pickle.HIGHEST_PROTOCOL)
+            os.chmod(temp_file, 0o600)
+            # Windows will not rename over an existing file
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            os.rename(temp_file, cache_file)
+            mlg.info("Cached catalog written to: %s", cache_file)
+        except (IOError, OSError, pickle.PicklingError) as e:
+            mlg.warning("Unable to write cached catalog, %s.  Error: %s", cache_file, e)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+class AssetCache:
+    SOURCES = "sources"
+    OBJECTS = "objects"
+
+    def __init__(self, cache_dir=None, max_bytes=2 << 30):
+        """
+        Content addressed local copies of server files.  Every source and every object is a file of its own instead of
+        an entry in a shared index, so several processes, batch workers or Maya sessions, can share one cache folder.
+        :param cache_dir: The cache folder, default_cache_dir()/assets by default
+        :param max_bytes: Least recently used objects are evicted beyond this size
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(default_cache_dir(), "assets")
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        # Evictions may be started by the copy engine's worker threads
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_cache_dir(self):
+        return self.cache_dir
+
+    def get_max_bytes(self):
+        return self.max_bytes
+
+    def get_size(self):
+        return sum(size for digest, local, size, used in self._list_objects())
+
+    # ---------------------------------------------------
+    #                       Methods
+    # ---------------------------------------------------
+
+    def resolve(self, src):
+        """
+        Returns a local copy of src, downloading it only if the server file changed since it was cached.  Falls back
+        to the last cached copy if the server file can not be reached.
+        :param src: A path to a file on the server
+        :return: A path to the local copy, which keeps src's file name
+        """
+        private_dir(self.cache_dir)
+
+        key = os.path.normcase(os.path.abspath(src))
+        entry = self._read_source(key)
+
+        try:
+            st = os.stat(src)
+        except OSError as e:
+            local = self._object_path(entry)
+            if local is not None:
+                mlg.warning("Unable to stat %s, using cached copy.  Error: %s", src, e)
+                self._touch(local)
+                return local
+            raise
+
+        if entry is not None and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+            local = self._object_path(entry)
+            if local is not None:
+                mlg.debug("Asset cache hit: %s", src)
+                self._touch(local)
+                return local
+
+        mlg.info("Asset cache miss, downloading: %s", src)
+        digest, temp_file = self._download(src)
+        local = self._store(digest, temp_file, os.path.basename(src))
+
+        self._write_source(key, {"source": src,
+                                 "mtime": st.st_mtime,
+                                 "size": st.st_size,
+                                 "digest": digest
+                                 })
+        self._evict(keep=digest)
+        return local
+
+    def clear(self):
+        """ Removes every cached asset """
+        with self._lock:
+            if os.path.isdir(self.cache_dir):
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _download(self, src):
+        temp_file = os.path.join(self.cache_dir, "download_{0}_{1}.tmp".format(os.getpid(),
+                                                                               threading.current_thread().ident
+                                                                               ))
+        shutil.copy2(src, temp_file)
+        return file_hash(temp_file), temp_file
+
+    def _store(self, digest, temp_file, name):
+        existing = self._object_file(digest)
+        if existing is not None:
+            # Same contents already cached, under another name or by another process
+            os.remove(temp_file)
+            self._touch(existing)
+            return existing
+
+        folder = os.path.join(self.cache_dir, self.OBJECTS, digest)
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+
+        local = os.path.join(folder, name)
+        try:
+            os.rename(temp_file, local)
+        except OSError:
+            # Another process stored the same object first, Windows will not rename over it
+            os.remove(temp_file)
+            if not os.path.isfile(local):
+                raise
+
+        self._touch(local)
+        return local
+
+    def _object_file(self, digest):
+        folder = os.path.join(self.cache_dir, self.OBJECTS, digest)
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return None
+        for name in names:
+            local = os.path.join(folder, name)
+            if os.path.isfile(local):
+                return local
+        return None
+
+    def _object_path(self, entry):
+        if entry is None:
+            return None
+        return self._object_file(entry["digest"])
+
+    def _touch(self, local):
+        # An object's mtime is its last use, hits only touch the object and write nothing else
+        try:
+            os.utime(local, None)
+        except OSError:
+            pass
+
+    def _source_file(self, key):
+        return os.path.join(self.cache_dir, self.SOURCES, "{}.json".format(key_hash(key)))
+
+    def _read_source(self, key):
+        try:
+            with open(self._source_file(key), "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _write_source(self, key, entry):
+        source_file = self._source_file(key)
+        temp_file = "{0}.{1}_{2}.tmp".format(source_file, os.getpid(), threading.current_thread().ident)
+        try:
+            if not os.path.isdir(os.path.dirname(source_file)):
+                os.makedirs(os.path.dirname(source_file))
+            with open(temp_file, "w") as f:
+                json.dump(entry, f)
+            # Windows will not rename over an existing file
+            if os.path.exists(source_file):
+                os.remove(source_file)
+            os.rename(temp_file, source_file)
+        except (IOError, OSError) as e:
+            # The next resolve of this source downloads it again
+            mlg.warning("Unable to write asset cache entry, %s.  Error: %s", source_file, e)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _list_objects(self):
+        """ A list of (digest, local file, size, last use) tuples for every cached object """
+        objects = []
+        try:
+            digests = os.listdir(os.path.join(self.cache_dir, self.OBJECTS))
+        except OSError:
+            return objects
+
+        for digest in digests:
+            local = self._object_file(digest)
+            if local is None:
+                continue
+            try:
+                st = os.stat(local)
+            except OSError:
+                continue
+            objects.append((digest, local, st.st_size, st.st_mtime))
+        return objects
+
+    def _evict(self, keep=None):
+        with self._lock:
+            objects = sorted(self._list_objects(), key=lambda o: o[3])
+            total = sum(o[2] for o in objects)
+            now = time.time()
+
+            for digest, local, size, used in objects:
+                if total <= self.max_bytes:
+                    break
+
+                # Another process may still be importing an object it resolved moments ago
+                if digest == keep or now - used < EVICT_GRACE:
+                    continue
+
+                mlg.info("Evicting cached asset: %s", local)
+                shutil.rmtree(os.path.join(self.cache_dir, self.OBJECTS, digest), ignore_errors=True)
+                total -= size
+
+
+def default_cache_dir():
+    """ The per-user lettuce cache folder, ~/.lettuce/cache """
+    return os.path.join(os.path.expanduser("~"), ".lettuce", "cache")
+
+
+def is_private(path):
+    """
+    Checks that path belongs to the current user and that no one else can write to it.  Always True on Windows, where
+    the home folder's ACL already keeps other users out.
+    :param path: A file or folder
+    :return: True if only the current user can write to path
+    """
+    if not hasattr(os, "getuid"):
+        return True
+
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def private_dir(folder):
+    """
+    Creates folder readable and writable by the current user only, or checks that an existing one is private
+    :param folder: The cache folder
+    :return: folder
+    :raise OSError: If the folder belongs to another user or others can write to it
+    """
+    try:
+        os.makedirs(folder, 0o700)
+    except OSError:
+        if not os.path.isdir(folder):
+            raise
+
+    if not is_private(folder):
+        raise OSError(errno.EACCES, "Cache folder is writable by other users", folder)
+    return folder
+
+
+def key_hash(key):
+    """
+    Hashes a cache key, e.g. a path
+    :param key: A str or unicode string, Maya returns unicode paths
+    :return: The hex md5 digest of the key, encoded as utf-8 when unicode
+    """
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return hashlib.md5(key).hexdigest()
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """
+    Hashes a file's contents in blocks
+    :param file_path: A path to a file
+    :param block_size: The number of bytes read per block
+    :return: The hex md5 digest of the file
+    """
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        block = f.read(block_size)
+        while block:
+            md5.update(block)
+            block = f.read(block_size)
+    return md5.hexdigest()
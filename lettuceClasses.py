@@ -1,4 +1,5 @@
-from os.path import normpath
+import re
+from os.path import normpath, normcase
 # The character Class is the main container for all information relevant to the character.  It takes the parameter from
 # the xml element tree and then builds the character from that.  It calls on two other classes, collection and
 # mayaObjects.  These should not be constructed directly.  If the xml dom is not formatted correctly, this will fail.
@@ -17,16 +18,24 @@ class Character:
         self.collections = []
         self.mayaObjects = []
 
+        # Version lookups, the first element with a given version wins just like the old linear scans
+        self._col_index = {}
+        self._mobj_index = {}
+
         temp_col = col
         temp_mobj = mobj
 
         if temp_col is not None:
             for c in temp_col:
-                self.collections.append(_Collection(c))
+                collection = _Collection(c)
+                self.collections.append(collection)
+                self._col_index.setdefault(collection.get_version(), collection)
 
         if temp_mobj is not None:
             for m in temp_mobj:
-                self.mayaObjects.append(_MayaObject(m))
+                maya_object = _MayaObject(m)
+                self.mayaObjects.append(maya_object)
+                self._mobj_index.setdefault(maya_object.get_version(), maya_object)
 
         self.current_collection = self.collections[0]
         self.current_mayaObjects = self.mayaObjects[0]
@@ -54,26 +63,21 @@ class Character:
         return self.mayaObjects
 
     def get_hairMayaFile_by_version(self, version):
-        return self._col_by_version(version).hairMayaFile
+        return self._col_by_version(version).get_hairMayaFile()
 
     def get_xgenFile_by_version(self, version):
-        return self._col_by_version(version).get_xgenFile
+        return self._col_by_version(version).get_xgenFile()
 
-    def get_default_collection(self):
-        for col in self.collections:
-            if col.get_version() == "default":
-                return col
+    def get_collection_versions(self):
+        return [c.get_version() for c in self.collections]
 
-        # If no matches found
-        return self.collections[0]
+    def get_default_collection(self):
+        # The first collection when none is named default
+        return self._col_index.get("default", self.collections[0])
 
     def get_default_mayaObjects(self):
-        for mobj in self.mayaObjects:
-            if mobj.get_version() == "default":
-                return mobj
-
-        # If no matches found
-        return self.mayaObjects[0]
+        # The first maya objects when none are named default
+        return self._mobj_index.get("default", self.mayaObjects[0])
 
     def get_current_collection(self):
         return self.current_collection
@@ -82,18 +86,17 @@ class Character:
     def get_current_mayaObjects(self):
         return self.current_mayaObjects
 
+    def is_same_entry(self, other):
+        # True when other was built from an identical xml entry, the current selections are not compared
+        return str(self) == str(other)
+
     # ---------------------------------------------------
     #                       Setters
     # ---------------------------------------------------
 
     def set_current_collection(self, collection_name):
-        col = []
-        for c in self.collections:
-            col.append(c.get_version())
-        if collection_name in col:
-            for c in self.collections:
-                if c.get_version() == collection_name:
-                    self.current_collection = c
+        if collection_name in self._col_index:
+            self.current_collection = self._col_index[collection_name]
         else:
             raise NameError("Name: {0} does not match a collection in object{1}.".format(collection_name,
                                                                                          self.charName
@@ -107,20 +110,95 @@ class Character:
     # ---------------------------------------------------
 
     def _col_by_version(self, version):
-        for col in self.collections:
-            if col.get_version() == version:
-                return col
-
-        # If no matches found
-        return None
+        # None when there is no entry for version
+        return self._col_index.get(version)
 
     def _mobj_by_version(self, version):
-        for mobj in self.mayaObjects:
-            if mobj.get_version() == version:
-                return mobj
+        # None when there is no entry for version
+        return self._mobj_index.get(version)
+
+# **********************************************************************************************************************
+#                                                 CharacterCatalog
+# **********************************************************************************************************************
+
+
+class CharacterCatalog:
+    """
+    An indexed, ordered container of Character objects.  Behaves like the list generate_characters used to return
+    (iteration, len, indexing) while offering dict lookups by name, alt name and referenced mesh file.
+    """
+
+    def __init__(self, characters=None):
+        self._characters = []
+
+        self._by_name = {}
+        self._by_alt_name = {}
+        self._by_mesh_file = {}
+
+        if characters is not None:
+            for c in characters:
+                self.add(c)
+
+    def __iter__(self):
+        return iter(self._characters)
+
+    def __len__(self):
+        return len(self._characters)
+
+    def __getitem__(self, index):
+        return self._characters[index]
+
+    def __contains__(self, character):
+        return character in self._characters
+
+    def __str__(self):
+        return "CharacterCatalog({} characters)".format(len(self._characters))
 
-        # If no matches found
-        return None
+    def __repr__(self):
+        return str(self)
+
+    def add(self, character):
+        """
+        Adds a character to the catalog and indexes it
+        :param character: A Character object
+        :return: Nothing
+        """
+        self._characters.append(character)
+
+        self._by_name.setdefault(character.get_charName(), character)
+        self._by_alt_name.setdefault(character.get_charAltName(), character)
+
+        for mobj in character.get_mayaObjects():
+            mesh_file = mobj.get_origMeshFile()
+            if not mesh_file:
+                continue
+            chars = self._by_mesh_file.setdefault(normalize_path(mesh_file), [])
+            if character not in chars:
+                chars.append(character)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_characters(self):
+        return list(self._characters)
+
+    def get_by_charName(self, charName):
+        return self._by_name.get(charName)
+
+    def get_by_charAltName(self, charAltName):
+        return self._by_alt_name.get(charAltName)
+
+    def get_by_meshFile(self, mesh_file):
+        """
+        Reverse lookup from a character's referenced mesh file to the characters using it
+        :param mesh_file: The mayaFile path of a mayaObject, as written in the xml
+        :return: A list of Character objects, empty if none match
+        """
+        return list(self._by_mesh_file.get(normalize_path(mesh_file), []))
+
+    def get_meshFiles(self):
+        return list(self._by_mesh_file.keys())
 
 # **********************************************************************************************************************
 #                                                  _Collections
@@ -139,7 +217,7 @@ class _Collection:
         try:
             self._xgenFile = normpath(element.find("xgenFile").text)
         except AttributeError:
-            self._mayaFile = ""
+            self._xgenFile = ""
 
         self._hairPlates = []
 
@@ -215,10 +293,16 @@ class _MayaObject:
 
 
 class SetPackage:
-    def __init__(self, node_set, set_name):
+    def __init__(self, node_set, set_name, updated=True, mode="import"):
         self.node_set = node_set
         self.name = set_name
 
+        # False when the set was already up to date and nothing was imported
+        self.updated = updated
+
+        # "import" or "reference", how the hair file was brought into the scene
+        self.mode = mode
+
     def __str__(self):
         return self.name
 
@@ -235,6 +319,74 @@ class SetPackage:
     def get_name(self):
         return self.name
 
+    def is_updated(self):
+        return self.updated
+
+    def get_mode(self):
+        return self.mode
+
+# **********************************************************************************************************************
+#                                                  DeletionReport
+# **********************************************************************************************************************
+
+
+class DeletionReport:
+    def __init__(self, set_name):
+        self.name = set_name
+
+        self.references = []
+        self.nodes = []
+        self.failed = []
+
+    def __str__(self):
+        return "{0}: {1} references removed, {2} nodes deleted, {3} failed".format(self.name,
+                                                                                 len(self.references),
+                                                                                 len(self.nodes),
+                                                                                 len(self.failed)
+                                                                                 )
+
+    def __repr__(self):
+        return str(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_name(self):
+        return self.name
+
+    def get_references(self):
+        return self.references
+
+    def get_nodes(self):
+        return self.nodes
+
+    def get_failed(self):
+        return self.failed
+
+# **********************************************************************************************************************
+#                                                     Progress
+# **********************************************************************************************************************
+
+
+class Progress:
+    """
+    Progress reporting used by the pipeline functions.  This base class reports nothing and is never cancelled, which
+    is what headless runs want.  xgenSetup.MayaProgress drives Maya's main progress bar instead.
+    """
+
+    def begin(self, status, max_value):
+        pass
+
+    def step(self):
+        pass
+
+    def is_cancelled(self):
+        return False
+
+    def end(self):
+        pass
+
 # **********************************************************************************************************************
 #                                                    Exceptions
 # **********************************************************************************************************************
@@ -242,3 +394,38 @@ class SetPackage:
 
 class CharacterError(Exception):
     pass
+
+# **********************************************************************************************************************
+#                                                     Helpers
+# **********************************************************************************************************************
+
+
+_COPY_NUMBER = re.compile(r"\{\d+\}$")
+
+
+def normalize_path(path):
+    """
+    Normalizes a file path for comparisons so the xml and maya's reference paths agree on case and separators
+    :param path: A file path string
+    :return: The normalized path, using forward slashes
+    """
+    return normcase(normpath(path)).replace("\\", "/")
+
+
+def path_suffixes(path):
+    """
+    Lists every trailing run of path components of a path, normalized, longest first.  Maya's copy number suffix on
+    repeated references, e.g. {1}, is dropped.  Used to match the project relative paths in the xml against the
+    absolute paths maya reports for references.
+    :param path: A file path string
+    :return: A list of normalized path suffixes
+    """
+    full_path = normalize_path(_COPY_NUMBER.sub("", path))
+    parts = full_path.split("/")
+
+    suffixes = ["/".join(parts[i:]) for i in range(len(parts)) if parts[i]]
+
+    # Absolute paths keep their leading separator
+    if not suffixes or suffixes[0] != full_path:
+        suffixes.insert(0, full_path)
+    return suffixes
@@ -1,128 +1,362 @@
 import ConfigParser
+import collections
+import logging
 import os
 import sys
-import time
 import getpass
+import socket
 
 # Configuration File Setup
+#
+# The configuration is layered, each layer overriding the options of the ones before it:
+#   site - lettuceConfig.ini next to this module
+#   show - the [layers] show ini, or LETTUCE_SHOW_CONFIG
+#   user - the [layers] user ini, ~/.lettuce/lettuceConfig.ini by default, or LETTUCE_USER_CONFIG
+#   env  - LETTUCE_<SECTION>_<OPTION> variables, e.g. LETTUCE_PATHS_PROJECT or LETTUCE_LOGGING_ROOT_LEVEL
+#
+# The layers are parsed once into an immutable Settings tuple with its paths resolved and its values converted.
+# get_configuration returns the process wide Configuration, reload re-parses only when a layer's mtime changed.
+#
+# In mirror mode the project is read from a local mirror of the few server files lettuce reads, the xml and the
+# collection .ma and .xgen files, kept up to date by sync_mirror.  Writes, like the logs, still go to the server.
+
+mlg = logging.getLogger("lettuce.lettuceConfig")
+
+ENV_PREFIX = "LETTUCE_"
+
+Settings = collections.namedtuple("Settings", ["operating_system",
+                                               "server",
+                                               "project",
+                                               "server_project",
+                                               "local",
+                                               "mirror",
+                                               "mirror_project",
+                                               "xml_path",
+                                               "xml_file",
+                                               "log_folder",
+                                               "log_level",
+                                               "log_max_bytes",
+                                               "log_backups",
+                                               "log_interval",
+                                               "log_retention",
+                                               "version",
+                                               "hair_mode",
+                                               "hair_defer",
+                                               "cache_hash",
+                                               "asset_cache",
+                                               "asset_cache_limit",
+                                               ])
 
 
 class Configuration:
 
-    def __init__(self):
-        self.Config = ConfigParser.ConfigParser()
-        self.operatingSystem = ""
-
+    def __init__(self, config_file=None):
         # calls the config file that is located in the same directory as the module
 
-        __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
-        self.Config.read(os.path.join(__location__, 'lettuceConfig.ini'))
-
-        # OS Switch
-
-        if sys.platform == "linux" or sys.platform == "linux2":
-            # linux
-            self.operatingSystem = "linux"
-
-        elif sys.platform == "darwin":
-            # OS X
-            self.operatingSystem = "osx"
-
-        elif sys.platform == "win32":
-            # Windows...
-            self.operatingSystem = "windows"
-
-        else:
-            raise OSError('Unsupported Operating System')
-
-        self.server = self._server_connect()
-        self.project = self._project_set()
+        if config_file is None:
+            __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+            config_file = os.path.join(__location__, 'lettuceConfig.ini')
+
+        self.config_file = config_file
+
+        # Layer file to its mtime when last read, None for missing layers
+        self._mtimes = {}
+        self.layers = []
+        self.settings = None
+
+        self.reload(force=True)
+
+    def reload(self, force=False):
+        """
+        Re-parses the configuration if any of its layer files changed on disk since they were last read
+        :param force: Re-parses even if no file changed
+        :return: True if the configuration was re-parsed
+        """
+        if not force and all(get_mtime(f) == m for f, m in self._mtimes.items()):
+            return False
+
+        self.layers = get_layers(self.config_file)
+        self._mtimes = dict((f, get_mtime(f)) for f in self.layers)
+        self.settings = parse_settings(read_sections(self.layers))
+        mlg.debug("Configuration loaded from %s", self.layers)
+        return True
+
+    def sync_mirror(self, project_paths=(), workers=4):
+        """
+        Updates the local project mirror from the server, files that did not change are skipped
+        :param project_paths: Project relative paths to mirror, the character xml is always included
+        :param workers: The number of copy threads
+        :return: A lettuceCopy.CopyReport, or None when mirror mode is off
+        """
+        if not self.settings.mirror:
+            return None
+
+        # Imported here, the copy engine is only needed in mirror mode
+        import lettuceCopy
+
+        pairs = []
+        for p in [self.settings.xml_path] + list(project_paths):
+            pairs.append((join_config_path(self.settings.server_project, p),
+                          join_config_path(self.settings.mirror_project, p)
+                          ))
+
+        report = lettuceCopy.copy_files(pairs, workers=workers)
+        mlg.info("Mirror synchronized: %s", report)
+        return report
 
-    # From the python wiki: https://wiki.python.org/moin/ConfigParserExamples
-    # returns a dict representing the sections given
-
-    def _config_by_section(self, section):
-        config_dict = {}
-        options = self.Config.options(section)
-        for option in options:
-            try:
-                config_dict[option] = self.Config.get(section, option)
-                if config_dict[option] == -1:
-                    print("skip: {}".format(option))
-            except KeyError:
-                print("exception on {}!".format(option))
-                config_dict[option] = None
-        return config_dict
-
-    def _server_connect(self):
-        if self.operatingSystem == "windows":
-            if self._config_by_section(self.operatingSystem)['unc'] == "1":
-                server = self._config_by_section(self.operatingSystem)['server']
-            else:
-                server = self._config_by_section(self.operatingSystem)['server']
-        else:
-            server = self._config_by_section(self.operatingSystem)['server']
-
-        return os.path.normpath(server)
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
 
-    def _project_set(self):
-        # sets the project
+    def get_settings(self):
+        return self.settings
 
-        # Local Disk based project
-        if self._config_by_section("paths")['local'] == "1":
-            project = self._config_by_section("paths")['project']
+    def get_layers(self):
+        return list(self.layers)
 
-        # Server Based Project
-        else:
-            unresolved_project = sanitize_path_list((self._config_by_section("paths")['project']).split('/'))
+    def get_project(self):
+        """ The project files are read from, the local mirror in mirror mode """
+        return self.settings.project
 
-            project = self.server
+    def get_server_project(self):
+        """ The project on the server, where files are written """
+        return self.settings.server_project
 
-            for l in unresolved_project:
-                project = os.path.join(project, l)
+    def get_mirror(self):
+        return self.settings.mirror
 
-        return os.path.normpath(project)
+    def get_server(self):
+        return self.settings.server
 
-    # ---------------------------------------------------
-    #                       Getters
-    # ---------------------------------------------------
+    def get_xml_file(self):
+        return self.settings.xml_file
 
-    def get_project(self):
-        return self.project
+    def get_version(self):
+        return self.settings.version
 
-    def get_server(self):
-        return self.server
+    def get_log_file(self):
+        """
+        One log per Maya session, named after the user, machine and process so concurrent sessions never write or
+        rotate each other's file.  lettuceLogging rotates it and prunes the logs of finished sessions.
+        """
+        log_name = "lettuce_{0}-{1}-{2}-{3}.log".format(self.get_version(),
+                                                        getpass.getuser(),
+                                                        socket.gethostname().split(".")[0],
+                                                        os.getpid()
+                                                        )
 
-    def get_xml_file(self):
-        xml_file_list = (self._config_by_section("paths"))['xmlfile'].split('/')
+        return os.path.join(self.settings.log_folder, log_name)
 
-        xml_file_path = self.project
+    def get_log_max_bytes(self):
+        return self.settings.log_max_bytes
 
-        for l in xml_file_list:
-            xml_file_path = os.path.join(xml_file_path, l)
-        return xml_file_path
+    def get_log_backups(self):
+        return self.settings.log_backups
 
-    def get_version(self):
-        return (self._config_by_section("general"))['version']
+    def get_log_interval(self):
+        """ Seconds before the log file is rotated, 0 disables time based rotation """
+        return self.settings.log_interval
 
-    def get_log_file(self):
-        log_folder_list = ((self._config_by_section("paths"))['log']).split('/')
-        log_name = "lettuce_{0}-{1}-{2}.log".format(self.get_version(),
-                                                    getpass.getuser(),
-                                                    time.strftime("%y%m%d-%H.%M.%S")
-                                                    )
+    def get_log_retention(self):
+        """ Seconds old log files are kept, 0 keeps them forever """
+        return self.settings.log_retention
 
-        log_folder_path = self.project
+    def get_hair_mode(self):
+        return self.settings.hair_mode
 
-        for l in log_folder_list:
-            log_folder_path = os.path.join(log_folder_path, l)
+    def get_hair_defer(self):
+        return self.settings.hair_defer
 
-        return os.path.join(log_folder_path, log_name)
+    def get_cache_hash(self):
+        return self.settings.cache_hash
 
+    def get_asset_cache(self):
+        return self.settings.asset_cache
 
+    def get_asset_cache_limit(self):
+        return self.settings.asset_cache_limit
 
     def get_log_level(self):
-        return "logging.{}".format(self._config_by_section("logging_root")["level"])
+        """ The configured level as a logging module constant, e.g. logging.DEBUG """
+        return self.settings.log_level
+
+
+_configuration = None
+
+
+def get_configuration():
+    """
+    Returns the process wide Configuration, created on first use.  Call its reload method to pick up ini changes.
+    :return: A Configuration
+    """
+    global _configuration
+
+    if _configuration is None:
+        _configuration = Configuration()
+    return _configuration
+
+
+def get_layers(site_file, environ=None):
+    """
+    Lists the configuration layer files, in the order they are applied
+    :param site_file: The site ini, which names the show and user layers
+    :param environ: The environment to read, os.environ by default
+    :return: A list of ini paths, layers that are not configured are left out, missing files are kept
+    """
+    if environ is None:
+        environ = os.environ
+
+    site = ConfigParser.ConfigParser()
+    site.read(site_file)
+
+    layers = [site_file]
+    for layer in ("show", "user"):
+        layer_file = environ.get("{0}{1}_CONFIG".format(ENV_PREFIX, layer.upper()))
+        if layer_file is None and site.has_option("layers", layer):
+            layer_file = site.get("layers", layer)
+        if layer_file:
+            layers.append(os.path.expanduser(layer_file))
+    return layers
+
+
+def get_mtime(file_path):
+    try:
+        return os.path.getmtime(file_path)
+    except OSError:
+        return None
+
+
+def read_sections(config_files):
+    """
+    Reads ini files into plain dicts and applies the environment overrides, later files override earlier ones
+    :param config_files: A list of ini paths, missing files are skipped
+    :return: A dict of section name to a dict of option to string value
+    """
+    config = ConfigParser.ConfigParser()
+    config.read(config_files)
+
+    sections = {}
+    for section in config.sections():
+        sections[section] = dict(config.items(section))
+
+    apply_env_overrides(sections)
+    return sections
+
+
+def apply_env_overrides(sections, environ=None):
+    """
+    Overrides options from LETTUCE_<SECTION>_<OPTION> environment variables, sections may contain underscores so
+    every known section is tried as a prefix.  Unknown sections can't be created from the environment.
+    :param sections: A dict from read_sections, modified in place
+    :param environ: The environment to read, os.environ by default
+    :return: Nothing
+    """
+    if environ is None:
+        environ = os.environ
+
+    for key, value in environ.items():
+        if not key.startswith(ENV_PREFIX):
+            continue
+        name = key[len(ENV_PREFIX):].lower()
+        for section in sections:
+            prefix = section.lower() + "_"
+            if name.startswith(prefix):
+                sections[section][name[len(prefix):]] = value
+
+
+def parse_settings(sections):
+    """
+    Converts the raw ini values into a Settings tuple
+    :param sections: A dict from read_sections
+    :return: A Settings
+    """
+    operating_system = get_operating_system()
+
+    paths = sections["paths"]
+
+    server = os.path.normpath(sections[operating_system]['server'])
+    local = to_bool(paths['local'])
+
+    # Local Disk based project
+    if local:
+        server_project = os.path.normpath(paths['project'])
+
+    # Server Based Project
+    else:
+        server_project = os.path.normpath(join_config_path(server, paths['project']))
+
+    # Reads come from the local mirror, a local project needs none
+    mirror_section = sections.get("mirror", {})
+    mirror = to_bool(mirror_section.get('enabled', "0")) and not local
+    mirror_project = os.path.normpath(join_config_path(os.path.expanduser(mirror_section.get('root', "")),
+                                                       paths['project']))
+
+    project = mirror_project if mirror else server_project
+
+    logging_root = sections["logging_root"]
+    level = logging_root["level"].upper()
+
+    return Settings(operating_system=operating_system,
+                    server=server,
+                    project=project,
+                    server_project=server_project,
+                    local=local,
+                    mirror=mirror,
+                    mirror_project=mirror_project,
+                    xml_path=paths['xmlfile'],
+                    xml_file=join_config_path(project, paths['xmlfile']),
+                    log_folder=join_config_path(server_project, paths['log']),
+                    log_level=getattr(logging, level, logging.DEBUG),
+                    # Megabytes, hours and days in the ini, bytes and seconds here
+                    log_max_bytes=int(logging_root.get('max_size', "0")) << 20,
+                    log_backups=int(logging_root.get('backups', "5")),
+                    log_interval=float(logging_root.get('rotate_hours', "0")) * 3600,
+                    log_retention=float(logging_root.get('retention_days', "0")) * 86400,
+                    version=sections["general"]['version'],
+                    hair_mode=sections["hair"]['mode'],
+                    hair_defer=to_bool(sections["hair"]['defer']),
+                    cache_hash=to_bool(sections["cache"]['hash']),
+                    asset_cache=to_bool(sections["cache"]['assets']),
+                    # Megabytes in the ini, bytes here
+                    asset_cache_limit=int(sections["cache"]['asset_limit']) << 20,
+                    )
+
+
+def get_operating_system():
+    # OS Switch
+
+    if sys.platform == "linux" or sys.platform == "linux2":
+        # linux
+        return "linux"
+
+    elif sys.platform == "darwin":
+        # OS X
+        return "osx"
+
+    elif sys.platform == "win32":
+        # Windows...
+        return "windows"
+
+    else:
+        raise OSError('Unsupported Operating System')
+
+
+def join_config_path(root, config_path):
+    """
+    Joins a forward slash separated path from the ini onto root with the native separator
+    :param root: The folder the path is relative to
+    :param config_path: A path from the ini, e.g. /cache/lettuce/hair_master_production.xml
+    :return: The joined path
+    """
+    path = root
+
+    for l in sanitize_path_list(config_path.split('/')):
+        path = os.path.join(path, l)
+    return path
+
+
+def to_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
 
 
 def sanitize_path_list(path_list):
@@ -0,0 +1,270 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import Queue
+
+from lettuceCache import file_hash
+
+# The copy engine moves files on a pool of worker threads while the calling thread, Maya's main thread in the UI,
+# drains the results queue.  Progress callbacks therefore always run on the calling thread.
+
+mlg = logging.getLogger("lettuce.lettuceCopy")
+
+COPIED = "copied"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Seconds of mtime drift tolerated when comparing files, covers filesystems with coarse timestamps
+MTIME_TOLERANCE = 2.0
+
+# **********************************************************************************************************************
+#                                                      CopyJob
+# **********************************************************************************************************************
+
+
+class CopyJob:
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+
+        self.status = None
+        self.error = None
+        self.size = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return "{0} -> {1} ({2})".format(self.src, self.dst, self.status)
+
+    def __repr__(self):
+        return str(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_src(self):
+        return self.src
+
+    def get_dst(self):
+        return self.dst
+
+    def get_status(self):
+        return self.status
+
+    def get_error(self):
+        return self.error
+
+# **********************************************************************************************************************
+#                                                     CopyReport
+# **********************************************************************************************************************
+
+
+class CopyReport:
+    def __init__(self, jobs, seconds):
+        self.jobs = jobs
+        self.seconds = seconds
+
+    def __str__(self):
+        return "{0} copied, {1} skipped, {2} failed, {3} cancelled, {4:.2f} MB in {5:.2f}s ({6:.2f} MB/s)".format(
+            len(self.get_copied()),
+            len(self.get_skipped()),
+            len(self.get_failed()),
+            len(self.get_cancelled()),
+            self.get_bytes() / 1048576.0,
+            self.seconds,
+            self.get_throughput() / 1048576.0
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_jobs(self):
+        return self.jobs
+
+    def get_copied(self):
+        return [j for j in self.jobs if j.status == COPIED]
+
+    def get_skipped(self):
+        return [j for j in self.jobs if j.status == SKIPPED]
+
+    def get_failed(self):
+        return [j for j in self.jobs if j.status == FAILED]
+
+    def get_cancelled(self):
+        return [j for j in self.jobs if j.status == CANCELLED]
+
+    def get_bytes(self):
+        """ The number of bytes actually transferred """
+        return sum(j.size for j in self.get_copied())
+
+    def get_seconds(self):
+        return self.seconds
+
+    def get_throughput(self):
+        """ Transferred bytes per second of wall time """
+        if self.seconds <= 0:
+            return 0.0
+        return self.get_bytes() / self.seconds
+
+    def ok(self):
+        return not self.get_failed() and not self.get_cancelled()
+
+# **********************************************************************************************************************
+#                                                      Engine
+# **********************************************************************************************************************
+
+
+def copy_files(pairs, workers=4, compare_hash=False, progress=None, cancelled=None, resolve=None):
+    """
+    Copies files concurrently, skipping the ones already up to date at their destination
+    :param pairs: A list of (source file, destination file or folder) tuples
+    :param workers: The number of copy threads
+    :param compare_hash: Compares file contents when sizes match instead of trusting mtimes
+    :param progress: Called on the calling thread with each finished CopyJob
+    :param cancelled: Polled on the calling thread, returning True stops the jobs that have not started yet
+    :param resolve: Maps a source file to the file actually read, e.g. lettuceCache.AssetCache.resolve.  Runs on the
+                    worker threads.
+    :return: A CopyReport
+    """
+    jobs = []
+    for src, dst in pairs:
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        jobs.append(CopyJob(src, dst))
+
+    start = time.time()
+
+    pending = Queue.Queue()
+    finished = Queue.Queue()
+    stop = threading.Event()
+
+    for j in jobs:
+        pending.put(j)
+
+    threads = []
+    for i in range(max(1, min(workers, len(jobs)))):
+        t = threading.Thread(target=_worker,
+                             name="lettuceCopy-{}".format(i),
+                             args=(pending, finished, stop, compare_hash, resolve)
+                             )
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    mlg.info("Copying %s files on %s threads", len(jobs), len(threads))
+
+    done = 0
+    while done < len(jobs):
+        if cancelled is not None and not stop.is_set() and cancelled():
+            mlg.info("Copy cancelled, %s of %s files finished", done, len(jobs))
+            stop.set()
+        try:
+            job = finished.get(timeout=0.1)
+        except Queue.Empty:
+            continue
+        done += 1
+        mlg.debug("%s", job)
+        if progress is not None:
+            progress(job)
+
+    for t in threads:
+        t.join()
+
+    report = CopyReport(jobs, time.time() - start)
+    mlg.info("Copy complete: %s", report)
+    return report
+
+
+def is_up_to_date(src, dst, compare_hash=False):
+    """
+    Checks whether dst already holds the same file as src
+    :param src: The source file
+    :param dst: The destination file
+    :param compare_hash: Compares contents when sizes match instead of mtimes, which catches an edit that kept the
+                         mtime, at the cost of reading both files
+    :return: True if copying can be skipped
+    """
+    if not os.path.isfile(dst):
+        return False
+
+    src_stat = os.stat(src)
+    dst_stat = os.stat(dst)
+
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+
+    if compare_hash:
+        return file_hash(src) == file_hash(dst)
+
+    return abs(src_stat.st_mtime - dst_stat.st_mtime) <= MTIME_TOLERANCE
+
+
+def _worker(pending, finished, stop, compare_hash, resolve):
+    while True:
+        try:
+            job = pending.get_nowait()
+        except Queue.Empty:
+            return
+
+        try:
+            if stop.is_set():
+                job.status = CANCELLED
+            else:
+                _copy_job(job, compare_hash, resolve)
+        except Exception as e:
+            # copy_files waits for every job, a job lost to an unexpected error would hang it
+            job.status = FAILED
+            job.error = e
+        finally:
+            finished.put(job)
+
+
+def _copy_job(job, compare_hash, resolve):
+    start = time.time()
+    part_file = job.dst + ".part"
+
+    try:
+        src = job.src
+        if resolve is not None:
+            src = resolve(src)
+
+        if is_up_to_date(src, job.dst, compare_hash):
+            job.status = SKIPPED
+        else:
+            _make_dirs(os.path.dirname(job.dst))
+
+            # Copies to a side file first so an interrupted transfer never looks complete
+            shutil.copy2(src, part_file)
+            if os.path.exists(job.dst):
+                os.remove(job.dst)
+            os.rename(part_file, job.dst)
+            job.size = os.path.getsize(job.dst)
+            job.status = COPIED
+    except (IOError, OSError) as e:
+        job.status = FAILED
+        job.error = e
+        if os.path.exists(part_file):
+            try:
+                os.remove(part_file)
+            except OSError:
+                pass
+
+    job.seconds = time.time() - start
+
+
+def _make_dirs(folder):
+    # Another worker may create the same folder between the check and makedirs
+    if not folder or os.path.isdir(folder):
+        return
+    try:
+        os.makedirs(folder)
+    except OSError:
+        if not os.path.isdir(folder):
+            raise
@@ -0,0 +1,353 @@
+import sys
+import logging
+import threading
+import traceback
+import Queue
+
+from lettuceClasses import Progress
+
+# Runs long pipeline operations without freezing Maya.  An operation is written as a generator, its routine, which is
+# stepped on Maya's main thread one chunk at a time through maya.utils.executeDeferred, so Maya redraws and handles
+# input between chunks.  Work that never touches Maya, copies, stat checks, xml parsing and asset prefetching, is
+# yielded as in_background(func, ...) and runs on a worker thread, its result is sent back into the routine:
+#
+#   def routine(task, characters):
+#       pairs = lxg.get_xgen_copy_pairs(characters)                              # main thread, queries Maya
+#       report = yield lettuceExecutor.in_background(lxg.copy_xgen_pairs, pairs, progress=task)
+#       for c in characters:
+#           lxg.wrap_hair_plates(c)                                              # main thread
+#           yield                                                                # lets Maya redraw
+#
+#   task = lettuceExecutor.get_executor().submit("Copy", routine, (characters,), listener=update_ui)
+#
+# The Task is a lettuceClasses.Progress, so the pipeline functions report on it directly.  Its listeners always run on
+# the main thread.  Cancelling stops the routine at its next yield, background functions polling task.is_cancelled stop
+# sooner.  Outside of interactive Maya, routines run to completion inside submit.
+
+mlg = logging.getLogger("lettuce.lettuceExecutor")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# Background threads shared by every task
+WORKERS = 2
+
+_executor = None
+
+# **********************************************************************************************************************
+#                                                        Task
+# **********************************************************************************************************************
+
+
+class Task(Progress):
+    def __init__(self, name, executor):
+        """
+        A routine submitted to an Executor, with its progress and outcome.  Not constructed directly, see
+        Executor.submit.
+        :param name: Shown while the task runs
+        :param executor: The Executor running it
+        """
+        self.name = name
+        self.executor = executor
+
+        self.state = PENDING
+        self.status = name
+        self.value = 0
+        self.maximum = 0
+
+        self.result = None
+        self.error = None
+
+        self.routine = None
+        self.listeners = []
+
+        self._cancel = threading.Event()
+
+        # Set while a listener call is queued for the main thread, so a fast worker queues one at a time
+        self._notify_pending = False
+
+    def __str__(self):
+        return "{0}: {1}, {2} of {3}".format(self.name, self.state, self.value, self.maximum)
+
+    def __repr__(self):
+        return str(self)
+
+    # ---------------------------------------------------
+    #                      Progress
+    # ---------------------------------------------------
+
+    def begin(self, status, max_value):
+        self.status = status
+        self.value = 0
+        self.maximum = max_value
+        self.executor.notify(self)
+
+    def step(self):
+        self.value += 1
+        self.executor.notify(self)
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def end(self):
+        self.executor.notify(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_name(self):
+        return self.name
+
+    def get_state(self):
+        return self.state
+
+    def get_status(self):
+        return self.status
+
+    def get_value(self):
+        return self.value
+
+    def get_maximum(self):
+        return self.maximum
+
+    def get_result(self):
+        return self.result
+
+    def get_error(self):
+        return self.error
+
+    def is_done(self):
+        return self.state in (DONE, CANCELLED, FAILED)
+
+    # ---------------------------------------------------
+    #                       Setters
+    # ---------------------------------------------------
+
+    def set_status(self, status):
+        self.status = status
+        self.executor.notify(self)
+
+    def set_result(self, result):
+        # Python 2 generators cannot return a value, routines hand their result over here
+        self.result = result
+
+    def add_listener(self, listener):
+        """
+        Calls listener(task) on the main thread whenever the progress or state changes
+        :param listener: A callable taking the Task
+        :return: Nothing
+        """
+        self.listeners.append(listener)
+
+    def cancel(self):
+        if self.is_done() or self.is_cancelled():
+            return
+        mlg.info("Cancelling %s", self.name)
+        self.status = "Cancelling ..."
+        self._cancel.set()
+        self.executor.notify(self)
+
+# **********************************************************************************************************************
+#                                                     Background
+# **********************************************************************************************************************
+
+
+class Background:
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return getattr(self.func, "__name__", repr(self.func))
+
+    def __repr__(self):
+        return str(self)
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+
+def in_background(func, *args, **kwargs):
+    """
+    Yielded by a routine to run func(*args, **kwargs) on a worker thread, the yield evaluates to its return value or
+    raises its exception.  func must not call Maya commands.
+    """
+    return Background(func, args, kwargs)
+
+# **********************************************************************************************************************
+#                                                      Executor
+# **********************************************************************************************************************
+
+
+class Executor:
+    def __init__(self, workers=WORKERS, defer=None):
+        """
+        Steps routines on the main thread and runs their background functions on a pool of worker threads
+        :param workers: The number of worker threads, started on the first background function
+        :param defer: Schedules a callable on the main thread, maya.utils.executeDeferred in interactive Maya.  Without
+                      it routines run inline, to completion, on the thread calling submit.
+        """
+        self.workers = workers
+        self.defer = defer
+
+        self.pending = Queue.Queue()
+        self.threads = []
+        self._lock = threading.Lock()
+
+        # The thread submitting tasks, Maya's main thread in the UI
+        self.main_thread = threading.current_thread()
+
+    def submit(self, name, routine, args=(), listener=None):
+        """
+        Starts a routine
+        :param name: The task's name
+        :param routine: A generator function called as routine(task, *args)
+        :param args: Further arguments for routine
+        :param listener: Added to the task's listeners before it starts
+        :return: The Task, already finished when running inline
+        """
+        task = Task(name, self)
+        if listener is not None:
+            task.add_listener(listener)
+        task.routine = routine(task, *args)
+
+        mlg.info("Starting %s", name)
+        self._schedule(self._advance, task)
+        return task
+
+    def notify(self, task):
+        """ Calls the task's listeners on the main thread, right away when called from it """
+        if self.is_inline() or threading.current_thread() is self.main_thread:
+            self._call_listeners(task)
+            return
+
+        with self._lock:
+            if task._notify_pending:
+                return
+            task._notify_pending = True
+        self.defer(self._flush_notify, task)
+
+    def is_inline(self):
+        return self.defer is None
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _schedule(self, func, *args):
+        if self.is_inline():
+            func(*args)
+        else:
+            self.defer(func, *args)
+
+    def _advance(self, task, value=None, exc_info=None):
+        """ Steps the routine up to its next background function, or its next chunk when running deferred """
+        if task.is_done():
+            return
+
+        task.state = RUNNING
+        while True:
+            if task.is_cancelled():
+                task.routine.close()
+                self._finish(task, CANCELLED)
+                return
+
+            try:
+                if exc_info is not None:
+                    request = task.routine.throw(*exc_info)
+                else:
+                    request = task.routine.send(value)
+            except StopIteration:
+                self._finish(task, DONE)
+                return
+            except Exception:
+                task.error = traceback.format_exc()
+                mlg.error("%s failed\n%s", task.name, task.error)
+                self._finish(task, FAILED)
+                return
+
+            value = exc_info = None
+
+            if isinstance(request, Background):
+                if not self.is_inline():
+                    self._submit_background(task, request)
+                    return
+                try:
+                    value = request.run()
+                except Exception:
+                    exc_info = sys.exc_info()
+                continue
+
+            # A chunk of main thread work ended, Maya gets to redraw before the next one
+            if not self.is_inline():
+                self.defer(self._advance, task)
+                return
+
+    def _submit_background(self, task, request):
+        mlg.debug("%s running %s in the background", task.name, request)
+        self.pending.put((task, request))
+
+        with self._lock:
+            # Workers live as long as Maya, they are started as background functions are first queued
+            if len(self.threads) < self.workers:
+                t = threading.Thread(target=self._worker, name="lettuceExecutor-{}".format(len(self.threads)))
+                t.daemon = True
+                t.start()
+                self.threads.append(t)
+
+    def _worker(self):
+        while True:
+            task, request = self.pending.get()
+            try:
+                value = request.run()
+            except Exception:
+                self.defer(self._advance, task, None, sys.exc_info())
+            else:
+                self.defer(self._advance, task, value)
+
+    def _finish(self, task, state):
+        task.state = state
+        mlg.info("Finished %s", task)
+        self._call_listeners(task)
+
+    def _flush_notify(self, task):
+        with self._lock:
+            task._notify_pending = False
+        self._call_listeners(task)
+
+    def _call_listeners(self, task):
+        for listener in task.listeners:
+            try:
+                listener(task)
+            except Exception:
+                mlg.exception("Task listener failed: %s", listener)
+
+
+def get_executor():
+    """
+    The executor shared by the UI, deferring to Maya's idle queue in interactive Maya and running inline elsewhere
+    :return: An Executor
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = Executor(defer=get_main_thread_defer())
+    return _executor
+
+
+def get_main_thread_defer():
+    """ maya.utils.executeDeferred in interactive Maya, None in batch mode or outside of Maya """
+    try:
+        import maya.utils
+        import maya.cmds
+    except ImportError:
+        return None
+
+    if maya.cmds.about(batch=True):
+        return None
+    return maya.utils.executeDeferred
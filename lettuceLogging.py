@@ -0,0 +1,249 @@
+import os
+import time
+import glob
+import Queue
+import atexit
+import logging
+import logging.handlers
+import threading
+
+# Log records are handed to a queue on the calling thread, Maya's main thread in the UI, and written to the log file by
+# a background thread, so a slow network share never stalls Maya.  The file rotates on size and age and old logs are
+# pruned after a retention period.
+#
+# install attaches at most one such handler to a logger, opening the UI again replaces it instead of adding another.
+# Queued records are drained and the file closed by shutdown, which runs at interpreter exit.
+
+mlg = logging.getLogger("lettuce.lettuceLogging")
+
+# Records queued beyond this are dropped rather than blocking the caller
+QUEUE_SIZE = 10000
+
+# Seconds shutdown waits for the writer to drain the queue
+SHUTDOWN_TIMEOUT = 5.0
+
+# Glob of the files pruned from the log folder, covers every session's log and its rotated backups
+LOG_PATTERN = "lettuce_*.log*"
+
+_STOP = object()
+
+_exit_registered = False
+
+# **********************************************************************************************************************
+#                                                  RotatingLogFile
+# **********************************************************************************************************************
+
+
+class RotatingLogFile(logging.handlers.RotatingFileHandler):
+    def __init__(self, filename, max_bytes=0, backup_count=5, interval=0, retention=0):
+        """
+        A file handler that rotates when the file grows too large or too old, keeping backup_count backups
+        :param filename: The log file
+        :param max_bytes: Rotates when the file would grow beyond this size, 0 disables it
+        :param backup_count: The number of rotated files kept, filename.1 being the newest
+        :param interval: Rotates files older than this many seconds, 0 disables it
+        :param retention: Deletes log files in the folder older than this many seconds, 0 disables it
+        """
+        # Opened on the first record, which is written by the writer thread
+        logging.handlers.RotatingFileHandler.__init__(self, filename, maxBytes=max_bytes, backupCount=backup_count,
+                                                      delay=True)
+        self.interval = interval
+        self.retention = retention
+
+        self.rollover_at = None
+        if self.interval:
+            try:
+                # A file left by an earlier session is as old as its last write
+                self.rollover_at = os.path.getmtime(self.baseFilename) + self.interval
+            except OSError:
+                self.rollover_at = time.time() + self.interval
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return 1
+        return logging.handlers.RotatingFileHandler.shouldRollover(self, record)
+
+    def doRollover(self):
+        logging.handlers.RotatingFileHandler.doRollover(self)
+
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+    def _open(self):
+        # Called by the writer thread on the first record and after every rollover, so short sessions that never
+        # rotate still clean up after the earlier ones
+        self.prune()
+        return logging.handlers.RotatingFileHandler._open(self)
+
+    def prune(self):
+        """
+        Deletes the log files in this file's folder that are older than the retention period
+        :return: A list of the deleted files
+        """
+        if not self.retention:
+            return []
+
+        cutoff = time.time() - self.retention
+        deleted = []
+        for f in glob.glob(os.path.join(os.path.dirname(self.baseFilename), LOG_PATTERN)):
+            if f == self.baseFilename:
+                continue
+            try:
+                if os.path.getmtime(f) < cutoff:
+                    os.remove(f)
+                    deleted.append(f)
+            except OSError:
+                # Another session may be pruning the same folder
+                pass
+        return deleted
+
+# **********************************************************************************************************************
+#                                                  AsyncLogHandler
+# **********************************************************************************************************************
+
+
+class AsyncLogHandler(logging.Handler):
+    def __init__(self, target, queue_size=QUEUE_SIZE):
+        """
+        Queues records for a background thread that passes them on to target
+        :param target: The handler that writes the records, e.g. a RotatingLogFile
+        :param queue_size: The number of records queued before new ones are dropped
+        """
+        logging.Handler.__init__(self)
+
+        # Lets install recognise its own handler, even one added before the module was reloaded
+        self.lettuce_async = True
+
+        self.target = target
+        self.queue = Queue.Queue(queue_size)
+        self.dropped = 0
+
+        self.writer = threading.Thread(target=self._write, name="lettuceLogWriter")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        """
+        Renders the record's message and traceback on the calling thread, its arguments may change before it is written
+        :param record: A logging.LogRecord
+        :return: The record, with its message merged and exc_info replaced by exc_text
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        """ Writes the queued records, then stops the writer thread and closes the target """
+        if self.writer.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=SHUTDOWN_TIMEOUT)
+            except Queue.Full:
+                pass
+            self.writer.join(SHUTDOWN_TIMEOUT)
+
+        self.target.close()
+        logging.Handler.close(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_filename(self):
+        return getattr(self.target, "baseFilename", None)
+
+    def get_dropped(self):
+        return self.dropped
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _write(self):
+        prune = getattr(self.target, "prune", None)
+        if prune is not None:
+            try:
+                prune()
+            except Exception:
+                pass
+
+        while True:
+            record = self.queue.get()
+            if record is _STOP:
+                break
+            try:
+                self.target.handle(record)
+            except Exception:
+                self.target.handleError(record)
+
+        self.target.flush()
+
+
+def install(logger, log_file, formatter=None, max_bytes=0, backup_count=5, interval=0, retention=0):
+    """
+    Attaches an asynchronous rotating file handler to logger, replacing the one a previous call attached
+    :param logger: A logging.Logger, e.g. logging.getLogger("lettuce")
+    :param log_file: The log file
+    :param formatter: A logging.Formatter for the file
+    :param max_bytes: Rotates when the file would grow beyond this size, 0 disables it
+    :param backup_count: The number of rotated files kept
+    :param interval: Rotates files older than this many seconds, 0 disables it
+    :param retention: Deletes log files older than this many seconds, 0 disables it
+    :return: The AsyncLogHandler, the existing one when it already writes to log_file
+    """
+    global _exit_registered
+
+    log_file = os.path.abspath(log_file)
+
+    for h in list(logger.handlers):
+        if not getattr(h, "lettuce_async", False):
+            continue
+        if h.get_filename() == log_file:
+            if formatter is not None:
+                h.target.setFormatter(formatter)
+            return h
+        logger.removeHandler(h)
+        h.close()
+
+    target = RotatingLogFile(log_file,
+                             max_bytes=max_bytes,
+                             backup_count=backup_count,
+                             interval=interval,
+                             retention=retention
+                             )
+    if formatter is not None:
+        target.setFormatter(formatter)
+
+    handler = AsyncLogHandler(target)
+    logger.addHandler(handler)
+
+    if not _exit_registered:
+        atexit.register(shutdown)
+        _exit_registered = True
+
+    return handler
+
+
+def shutdown(logger=None):
+    """
+    Flushes and removes the asynchronous handlers, called at interpreter exit
+    :param logger: The logger to clean up, the "lettuce" logger by default
+    :return: Nothing
+    """
+    if logger is None:
+        logger = logging.getLogger("lettuce")
+
+    for h in list(logger.handlers):
+        if getattr(h, "lettuce_async", False):
+            logger.removeHandler(h)
+            h.close()
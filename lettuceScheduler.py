@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import collections
+
+import lettuceBatch
+
+# Spreads batch scene jobs across several worker processes.  Each job runs lettuceBatch.py on a single scene in its own
+# interpreter, mayapy by default, so a crash or hang only costs that scene, which is then retried:
+#
+#   python lettuceScheduler.py --workers 4 --timeout 1800 --log results.json shots/sq010/*.ma
+#
+# The interpreter and its environment are configurable, a plain python with a stand-in maya package on its PYTHONPATH
+# exercises the scheduler without Maya.
+
+mlg = logging.getLogger("lettuce.lettuceScheduler")
+
+TIMEOUT = "timeout"
+CRASHED = "crashed"
+
+# **********************************************************************************************************************
+#                                                     SceneJob
+# **********************************************************************************************************************
+
+
+class SceneJob:
+    def __init__(self, scene, index=0):
+        self.scene = scene
+        self.index = index
+
+        self.status = None
+        self.attempts = 0
+        self.returncode = None
+        self.report = None
+        self.log_file = None
+        self.seconds = 0.0
+
+    def __str__(self):
+        return "{0} ({1}, {2} attempts)".format(self.scene, self.status, self.attempts)
+
+    def __repr__(self):
+        return str(self)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_scene(self):
+        return self.scene
+
+    def get_status(self):
+        return self.status
+
+    def get_report(self):
+        return self.report
+
+    def to_dict(self):
+        return {"scene": self.scene,
+                "status": self.status,
+                "attempts": self.attempts,
+                "returncode": self.returncode,
+                "seconds": self.seconds,
+                "log_file": self.log_file,
+                "report": self.report
+                }
+
+# **********************************************************************************************************************
+#                                                     Scheduler
+# **********************************************************************************************************************
+
+
+class Scheduler:
+    def __init__(self, workers=2, timeout=3600.0, retries=1, python=None, batch_args=None, env=None, work_dir=None,
+                 poll_interval=0.5):
+        """
+        :param workers: The number of concurrent worker processes
+        :param timeout: Seconds a single attempt may run before it is killed
+        :param retries: How many times a crashed or timed out scene is tried again
+        :param python: The worker interpreter, defaults to find_mayapy()
+        :param batch_args: Extra lettuceBatch.py arguments for every job, e.g. ["--no-save"]
+        :param env: Extra environment variables for the workers
+        :param work_dir: Folder for the per attempt reports and logs, a temp folder by default
+        :param poll_interval: Seconds between worker polls
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.python = python or find_mayapy()
+        self.batch_args = list(batch_args or [])
+        self.env = dict(env or {})
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="lettuce_batch_")
+        self.poll_interval = poll_interval
+
+        self.batch_script = os.path.splitext(os.path.abspath(lettuceBatch.__file__))[0] + ".py"
+
+    def run(self, scenes):
+        """
+        Runs every scene through a worker process, retrying crashes and timeouts
+        :param scenes: A list of scene files
+        :return: A list of SceneJob, in the order of scenes
+        """
+        jobs = [SceneJob(s, i) for i, s in enumerate(scenes)]
+        pending = collections.deque(jobs)
+        running = []
+
+        if not os.path.isdir(self.work_dir):
+            os.makedirs(self.work_dir)
+
+        mlg.info("Scheduling %s scenes on %s workers", len(jobs), self.workers)
+
+        while pending or running:
+            while pending and len(running) < self.workers:
+                job = pending.popleft()
+                running.append(self._start(job))
+
+            for attempt in list(running):
+                job, proc, start, report_file, log = attempt
+                elapsed = time.time() - start
+
+                if proc.poll() is None:
+                    if elapsed < self.timeout:
+                        continue
+                    mlg.warning("Scene timed out after %.0fs: %s", elapsed, job.scene)
+                    proc.kill()
+                    proc.wait()
+                    job.status = TIMEOUT
+                else:
+                    job.status = None
+
+                log.close()
+                running.remove(attempt)
+                job.seconds += elapsed
+                job.returncode = proc.returncode
+
+                if job.status is None:
+                    job.report = self._read_report(report_file)
+                    if job.report is None:
+                        mlg.warning("Worker exited with %s and no report: %s", proc.returncode, job.scene)
+                        job.status = CRASHED
+                    else:
+                        job.status = job.report["status"]
+
+                if job.status in (TIMEOUT, CRASHED) and job.attempts <= self.retries:
+                    mlg.info("Retrying scene: %s", job.scene)
+                    pending.append(job)
+                else:
+                    mlg.info("Scene finished: %s", job)
+
+            if running:
+                time.sleep(self.poll_interval)
+
+        return jobs
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _start(self, job):
+        job.attempts += 1
+
+        name = "job{0:04d}_{1}".format(job.index, job.attempts)
+        report_file = os.path.join(self.work_dir, name + ".json")
+        job.log_file = os.path.join(self.work_dir, name + ".log")
+
+        if os.path.exists(report_file):
+            os.remove(report_file)
+
+        cmd = [self.python, self.batch_script, "--report", report_file] + self.batch_args + [job.scene]
+
+        env = dict(os.environ)
+        env.update(self.env)
+
+        mlg.info("Starting attempt %s: %s", job.attempts, " ".join(cmd))
+
+        log = open(job.log_file, "w")
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env)
+
+        return job, proc, time.time(), report_file, log
+
+    def _read_report(self, report_file):
+        try:
+            with open(report_file, "r") as f:
+                reports = json.load(f)
+        except (IOError, ValueError):
+            return None
+
+        if not reports:
+            return None
+        return reports[0]
+
+
+def find_mayapy():
+    """ Finds the mayapy interpreter from LETTUCE_MAYAPY, MAYA_LOCATION or the PATH """
+    if os.environ.get("LETTUCE_MAYAPY"):
+        return os.environ["LETTUCE_MAYAPY"]
+
+    exe = "mayapy.exe" if sys.platform == "win32" else "mayapy"
+
+    if os.environ.get("MAYA_LOCATION"):
+        candidate = os.path.join(os.environ["MAYA_LOCATION"], "bin", exe)
+        if os.path.isfile(candidate):
+            return candidate
+
+    # Running inside mayapy already
+    candidate = os.path.join(os.path.dirname(sys.executable), exe)
+    if os.path.isfile(candidate):
+        return candidate
+
+    return exe
+
+
+def summarize(jobs):
+    """
+    Counts the jobs by final status
+    :param jobs: A list of SceneJob
+    :return: A dict of status to count
+    """
+    summary = collections.OrderedDict()
+    for j in jobs:
+        summary[j.status] = summary.get(j.status, 0) + 1
+    return summary
+
+
+def aggregate(jobs):
+    """
+    Builds the result log of a run
+    :param jobs: A list of SceneJob
+    :return: A dict with the summarize counts and every job's final attempt, report and log file
+    """
+    return {"summary": summarize(jobs),
+            "jobs": [j.to_dict() for j in jobs]
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs lettuce batch hair setup over many scenes in parallel")
+    parser.add_argument("scenes", nargs="*", help="Scene files or glob patterns")
+    parser.add_argument("--list", dest="list_file", help="A text file with one scene or pattern per line")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent worker processes")
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Seconds allowed per scene attempt")
+    parser.add_argument("--retries", type=int, default=1, help="Retries for crashed or timed out scenes")
+    parser.add_argument("--python", help="Worker interpreter, defaults to mayapy")
+    parser.add_argument("--work-dir", help="Folder for the per attempt reports and logs")
+    parser.add_argument("--log", help="Writes the aggregated JSON result log to this file")
+    parser.add_argument("--xml", dest="xml_file", help="The character xml file, passed to the workers")
+    parser.add_argument("--project", help="The maya project, passed to the workers")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="Leaves the scenes unsaved")
+    parser.add_argument("--mode", choices=["import", "reference"],
+                        help="Imports or references the hair files, passed to the workers")
+    parser.add_argument("--keep-work-dir", action="store_true",
+                        help="Keeps the per attempt reports and logs even when every scene succeeded")
+    args = parser.parse_args(argv)
+
+    lg = logging.getLogger("lettuce")
+    lg.setLevel(logging.INFO)
+    lg.addHandler(logging.StreamHandler(sys.stderr))
+
+    scenes = lettuceBatch.expand_scenes(args.scenes, args.list_file)
+    if not scenes:
+        parser.error("No scenes given")
+
+    batch_args = []
+    if args.xml_file:
+        batch_args += ["--xml", args.xml_file]
+    if args.project:
+        batch_args += ["--project", args.project]
+    if not args.save:
+        batch_args.append("--no-save")
+    if args.mode:
+        batch_args += ["--mode", args.mode]
+
+    scheduler = Scheduler(workers=args.workers,
+                          timeout=args.timeout,
+                          retries=args.retries,
+                          python=args.python,
+                          batch_args=batch_args,
+                          work_dir=args.work_dir
+                          )
+    jobs = scheduler.run(scenes)
+
+    result = aggregate(jobs)
+
+    if args.log:
+        with open(args.log, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    succeeded = all(j.status in (lettuceBatch.OK, lettuceBatch.NO_CHARACTERS) for j in jobs)
+
+    # Worker logs are only worth keeping when something went wrong
+    if succeeded and not args.keep_work_dir and not args.work_dir:
+        shutil.rmtree(scheduler.work_dir, ignore_errors=True)
+
+    for status, count in result["summary"].items():
+        mlg.info("%s: %s", status, count)
+
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
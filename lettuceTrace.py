@@ -0,0 +1,273 @@
+import os
+import time
+import json
+import logging
+import threading
+import functools
+import collections
+
+# Opt-in profiling of the Maya commands the pipeline issues.  While tracing is enabled the mc modules of xgenSetup and
+# tools.rr_wrap are swapped for TracedModule proxies that time every command, and the pipeline stages decorated with
+# traced (scan, copy, delete, import, wrap) open named spans around them:
+#
+#   lettuceTrace.enable()
+#   ...
+#   tracer = lettuceTrace.disable()
+#   print(tracer.summary())
+#   tracer.write_chrome_trace("lettuce_trace.json")
+#
+# The JSON loads in chrome://tracing or Perfetto, with each command nested under the stage that issued it.  Disabled,
+# a traced stage costs one global lookup.
+
+mlg = logging.getLogger("lettuce.lettuceTrace")
+
+# Events kept for the Chrome trace, the summary counts keep going beyond it
+MAX_EVENTS = 500000
+
+_tracer = None
+
+# Traced module to the mc it had before enable
+_originals = {}
+
+# **********************************************************************************************************************
+#                                                      Tracer
+# **********************************************************************************************************************
+
+
+class Tracer:
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.start = time.time()
+
+        self.events = []
+        self.dropped = 0
+
+        # Command name to [calls, seconds]
+        self.commands = collections.OrderedDict()
+
+        # Span name to [count, seconds, mc calls, mc seconds]
+        self.spans = collections.OrderedDict()
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---------------------------------------------------
+    #                     Recording
+    # ---------------------------------------------------
+
+    def call(self, name, func, args, kwargs):
+        """ Runs func(*args, **kwargs), recording it as a call of the command name """
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.time()
+            with self._lock:
+                stats = self.commands.setdefault(name, [0, 0.0])
+                stats[0] += 1
+                stats[1] += end - start
+                for span in self._get_stack():
+                    span[2] += 1
+                    span[3] += end - start
+                self._add_event(name, "mc", start, end)
+
+    def begin_span(self, name):
+        # [name, start, mc calls, mc seconds]
+        self._get_stack().append([name, time.time(), 0, 0.0])
+
+    def end_span(self):
+        name, start, calls, seconds = self._get_stack().pop()
+        end = time.time()
+        with self._lock:
+            stats = self.spans.setdefault(name, [0, 0.0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += end - start
+            stats[2] += calls
+            stats[3] += seconds
+            self._add_event(name, "stage", start, end, {"mc calls": calls})
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_commands(self):
+        return self.commands
+
+    def get_spans(self):
+        return self.spans
+
+    def get_calls(self):
+        return sum(c[0] for c in self.commands.values())
+
+    def summary(self):
+        """ The command and stage totals as a text table, the slowest first """
+        lines = ["{0:<28} {1:>8} {2:>12} {3:>12}".format("command", "calls", "total ms", "mean us")]
+        for name, (calls, seconds) in sorted(self.commands.items(), key=lambda c: -c[1][1]):
+            lines.append("{0:<28} {1:>8} {2:>12.2f} {3:>12.1f}".format(name, calls, seconds * 1e3,
+                                                                       seconds / calls * 1e6))
+
+        lines.append("")
+        lines.append("{0:<28} {1:>8} {2:>12} {3:>12} {4:>12}".format("stage", "count", "total ms", "mc calls", "mc ms"))
+        for name, (count, seconds, calls, mc_seconds) in sorted(self.spans.items(), key=lambda s: -s[1][1]):
+            lines.append("{0:<28} {1:>8} {2:>12.2f} {3:>12} {4:>12.2f}".format(name, count, seconds * 1e3, calls,
+                                                                               mc_seconds * 1e3))
+
+        if self.dropped:
+            lines.append("")
+            lines.append("{} trace events dropped".format(self.dropped))
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, trace_file):
+        """
+        Writes the recorded calls and spans in the Chrome trace event format
+        :param trace_file: The JSON file to write
+        :return: trace_file
+        """
+        with self._lock:
+            events = list(self.events)
+
+        with open(trace_file, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return trace_file
+
+    # ---------------------------------------------------
+    #                     Helpers
+    # ---------------------------------------------------
+
+    def _get_stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add_event(self, name, category, start, end, args=None):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+
+        event = {"name": name,
+                 "cat": category,
+                 "ph": "X",
+                 "ts": (start - self.start) * 1e6,
+                 "dur": (end - start) * 1e6,
+                 "pid": os.getpid(),
+                 "tid": threading.current_thread().ident
+                 }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+# **********************************************************************************************************************
+#                                                    TracedModule
+# **********************************************************************************************************************
+
+
+class TracedModule(object):
+    def __init__(self, module, tracer):
+        """
+        Stands in for a module, maya.cmds, timing every function called through it
+        :param module: The module, or a tools.LazyModule
+        :param tracer: The Tracer recording the calls
+        """
+        self.__dict__["_module"] = module
+        self.__dict__["_tracer"] = tracer
+        self.__dict__["_wrappers"] = {}
+
+    def __getattr__(self, attr):
+        wrapper = self._wrappers.get(attr)
+        if wrapper is None:
+            func = getattr(self._module, attr)
+            if not callable(func):
+                return func
+            wrapper = _traced_command(self._tracer, attr, func)
+            self._wrappers[attr] = wrapper
+        return wrapper
+
+    def __setattr__(self, attr, value):
+        setattr(self._module, attr, value)
+
+    def get_module(self):
+        return self._module
+
+
+def _traced_command(tracer, name, func):
+    # Commands take flags like name=, so the arguments are passed on as a tuple and dict
+    def command(*args, **kwargs):
+        return tracer.call(name, func, args, kwargs)
+
+    command.__name__ = name
+    return command
+
+
+def traced(stage):
+    """
+    Decorator that records the function as a span of the named pipeline stage while tracing is enabled
+    :param stage: The stage name, e.g. "import"
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            tracer.begin_span(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.end_span()
+        return wrapper
+    return decorator
+
+
+def enable(max_events=MAX_EVENTS):
+    """
+    Starts tracing with a new Tracer, replacing the mc of the traced modules
+    :param max_events: Events kept for the Chrome trace
+    :return: The Tracer
+    """
+    global _tracer
+
+    if _tracer is not None:
+        disable()
+
+    _tracer = Tracer(max_events)
+    for module in get_traced_modules():
+        _originals[module] = module.mc
+        module.mc = TracedModule(module.mc, _tracer)
+
+    mlg.info("Maya command tracing enabled")
+    return _tracer
+
+
+def disable():
+    """
+    Stops tracing and puts the original mc modules back
+    :return: The Tracer that was recording, or None when tracing was off
+    """
+    global _tracer
+
+    tracer = _tracer
+    _tracer = None
+
+    for module, mc in _originals.items():
+        module.mc = mc
+    _originals.clear()
+
+    if tracer is not None:
+        mlg.info("Maya command tracing disabled, %s calls recorded", tracer.get_calls())
+    return tracer
+
+
+def get_traced_modules():
+    """ The modules whose mc is traced, imported here as xgenSetup imports this module """
+    import xgenSetup
+    from tools import rr_wrap
+    return [xgenSetup, rr_wrap]
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def get_tracer():
+    return _tracer
@@ -1,31 +1,79 @@
-import maya.cmds as mc
 import lettuceConfig
+import lettuceExecutor
+import lettuceLogging
+import lettuceTrace
 import xgenSetup as lxg
+from lettuceCache import AssetCache
+from lettuceClasses import Progress
+from lettuceExecutor import in_background
+from tools import LazyModule
 import logging
 import os
 import math
+import time
+import tempfile
+
+mlg = logging.getLogger("lettuce.lettuceUI")
+
+# Resolved on first use, importing the UI module does not touch Maya
+mc = LazyModule("maya.cmds")
 
 
 class LettuceUI:
 
     _winName = 'Lettuce'
-    uiWindow = mc.window(t=_winName)
+
+    # A fixed window name, the window itself is only created by _createUI
+    uiWindow = 'lettuceUIWindow'
+
+    # Characters per page of the character list and the height of their rows
+    page_size = 10
+    row_height = 26
+
+    # Height of the task bar above the character list
+    task_bar_height = 24
 
     def __init__(self):
         # Config
-        self.config = lettuceConfig.Configuration()
+        self.config = lettuceConfig.get_configuration()
+
+        # Picks up edits made to the ini since the last time the UI was opened
+        self.config.reload()
 
         # Log setup
         self.lg = logging.getLogger("lettuce")
-        self.lg.setLevel(eval(self.config.get_log_level()))
+        self.lg.setLevel(self.config.get_log_level())
 
+        # Written by a background thread, opening the UI again reuses the handler instead of adding another
         self.log_file = self.config.get_log_file()
-        self.fh = logging.FileHandler(self.log_file)
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        self.fh.setFormatter(formatter)
-        self.lg.addHandler(self.fh)
+        formatter = logging.Formatter("%(asctime)s - %(name)s.%(funcName)s - %(levelname)s - %(message)s")
+        self.fh = lettuceLogging.install(self.lg,
+                                         self.log_file,
+                                         formatter,
+                                         max_bytes=self.config.get_log_max_bytes(),
+                                         backup_count=self.config.get_log_backups(),
+                                         interval=self.config.get_log_interval(),
+                                         retention=self.config.get_log_retention()
+                                         )
+
+        # atexit is not reliably reached when Maya quits, the handler is flushed on quitApplication as well
+        if getattr(self.fh, "quit_job", None) is None:
+            self.fh.quit_job = mc.scriptJob(event=["quitApplication", lettuceLogging.shutdown], runOnce=True)
+
         self.lg.info("LettuceUI Starting")
 
+        # Asset Cache
+        if self.config.get_asset_cache():
+            lxg.set_asset_cache(AssetCache(max_bytes=self.config.get_asset_cache_limit()))
+        else:
+            lxg.set_asset_cache(None)
+
+        # Project Mirror, synchronized in the background by each reload
+        if self.config.get_mirror():
+            lxg.set_asset_root(self.config.get_project())
+        else:
+            lxg.set_asset_root(None)
+
         # XML File
         self.xml_load_state = False
         self.char_xml_file = self.config.get_xml_file()
@@ -36,15 +84,21 @@ class LettuceUI:
         self.char_in_scene_list = []
         self.char_hair_sets = {}
 
+        # Character list, see _create_character_frame
+        self.listed_chars = []
+        self.filtered_chars = []
+        self.char_filter = ""
+        self.char_page = 0
+
+        # The lettuceExecutor.Task running, see _run_task
+        self.task = None
+
         # UI Creation
         self.title = "Lettuce UI v{}".format(self.config.get_version())
         self._createUI()
         self.lg.info("UI Created")
 
     def _createUI(self):
-
-        flg = logging.getLogger("lettuce.createUI")
-
         if mc.window(self.uiWindow, exists=True):
             mc.deleteUI(self.uiWindow)
 
@@ -54,12 +108,13 @@ class LettuceUI:
                   sizeable=False
                   )
 
+        # The character list pages instead of growing, so the window keeps one size
         mc.window(self.uiWindow,
-                  widthHeight=(406, 202),
+                  widthHeight=(406, self.page_size * self.row_height + self.task_bar_height + 64),
                   edit=True,
                   )
 
-        flg.info("Window Created")
+        mlg.info("Window Created")
 
         mc.menu("file_menu",
                 parent=self.uiWindow,
@@ -93,6 +148,13 @@ class LettuceUI:
         mc.menuItem(label="Log Path",
                     command=lambda *_: self._log_path_menu()
                     )
+        mc.menuItem(label="Clear Catalog Cache",
+                    command=lambda *_: self._clear_catalog_cache()
+                    )
+        mc.menuItem(label="Trace Maya Commands",
+                    checkBox=lettuceTrace.is_enabled(),
+                    command=lambda checked, *_: self._toggle_trace(checked)
+                    )
         mc.menuItem("lg_lvl_menu",
                     label="Log Level",
                     subMenu=True
@@ -128,48 +190,70 @@ class LettuceUI:
                     command=lambda *_: self._documentation()
                     )
 
-        flg.info("Menu Bar Created")
+        mlg.info("Menu Bar Created")
+
+        mc.columnLayout("lettuceColumn",
+                        parent=self.uiWindow,
+                        width=400,
+                        rowSpacing=2
+                        )
+
+        self._create_task_bar("lettuceColumn")
 
         mc.frameLayout('masterFrame',
+                       parent="lettuceColumn",
                        label='',
                        width=400,
                        labelVisible=False,
                        marginWidth=0
                        )
 
-        flg.info("Master Frame Created")
-
-        if self.xml_load_state:
-            flg.info("XML File Loaded")
-            self.char_in_scene_list = self._get_characters(self.char_xml_file)
-
-            if len(self.char_in_scene_list) > 0:
-                self.char_in_scene = True
-                flg.info("Characters verified in Scene")
-            else:
-                self.char_in_scene = False
-                flg.info("Characters verified not in scene")
-
-        if self.char_in_scene:
-            flg.info("Creating Character Menus")
-            self._create_character_frame(self.char_in_scene_list, "masterFrame")
-        else:
-            flg.info("Added reload button ")
-            mc.button('reloadButton',
-                      label="Reload",
-                      command=lambda *_: self._reloadUI("masterFrame")
-                      )
+        mlg.info("Master Frame Created")
 
         # Last UI line
 
-        flg.info("Showing UI...")
+        mlg.info("Showing UI...")
         mc.showWindow(self.uiWindow)
 
-    def _check_log_level(self, level):
-        flg = logging.getLogger("lettuce._check_log_level")
+        # The characters are filled in by a reload task, the window shows while the scene is scanned
+        self._reloadUI("masterFrame")
+
+    def _create_task_bar(self, parent):
+        """
+        Builds the status, progress bar and cancel button of the running task
+        :param parent: The layout to build in
+        :return: Nothing
+        """
+        mc.rowLayout("task_bar",
+                     parent=parent,
+                     width=400,
+                     height=self.task_bar_height,
+                     numberOfColumns=3,
+                     columnWidth3=[140, 200, 60]
+                     )
+        mc.text("task_status",
+                parent="task_bar",
+                label="",
+                width=135,
+                align="left"
+                )
+        mc.progressBar("task_progress",
+                       parent="task_bar",
+                       width=195,
+                       maxValue=1,
+                       progress=0
+                       )
+        mc.button("task_cancel",
+                  parent="task_bar",
+                  label="Cancel",
+                  width=58,
+                  enable=False,
+                  command=lambda *_: self._cancel_task()
+                  )
 
+    def _check_log_level(self, level):
         cur_level = self.lg.getEffectiveLevel()
-        flg.debug("Current Logging Level is: {}".format(cur_level))
+        mlg.debug("Current Logging Level is: %s", cur_level)
 
         if level == cur_level:
             return True
@@ -177,162 +261,242 @@ class LettuceUI:
             return False
 
     def _change_logging_level(self, level):
-        flg = logging.getLogger("lettuce._change_logging_level")
-        flg.debug("Changing Log Level to {}".format(level))
+        mlg.debug("Changing Log Level to %s", level)
         print("Changing Log Level to {}".format(level))
         self.lg.setLevel(eval(level))
 
-    def _get_characters(self, xml_file):
-
-        flg = logging.getLogger("lettuce._get_characters")
-
-        flg.info("Retrieving Characters from XML File: {}".format(xml_file))
-        all_chars = lxg.generate_characters(xml_file)
-        flg.info("Retrieved {} Characters in XML File".format(len(all_chars)))
+    def _create_character_frame(self, characters, parent):
+        """
+        Builds the character list, a name filter and one page of compact character rows.  Only the rows of the page
+        on screen exist, so building the UI takes the same time however many characters are in the shot.
+        :param characters: A list of the Character objects in the scene
+        :param parent: The layout to build in
+        :return: Nothing
+        """
+        mlg.info("Exactly %s characters", len(characters))
+
+        self.listed_chars = list(characters)
+        self.char_filter = ""
+        self.char_page = 0
+        self.filtered_chars = list(characters)
+
+        mc.columnLayout("char_column",
+                        parent=parent,
+                        width=400,
+                        rowSpacing=2
+                        )
 
-        flg.debug("Characters Retrieved: ")
-        for c in all_chars:
-            flg.debug(c.get_charName())
+        mc.rowLayout("char_header",
+                     parent="char_column",
+                     width=400,
+                     numberOfColumns=4,
+                     columnWidth4=[220, 30, 110, 30]
+                     )
+        mc.textField("char_filter",
+                     parent="char_header",
+                     width=215,
+                     placeholderText="Filter characters",
+                     textChangedCommand=lambda text, *_: self._filter_characters(text)
+                     )
+        mc.button("char_page_prev",
+                  parent="char_header",
+                  label="<",
+                  width=28,
+                  command=lambda *_: self._change_page(-1)
+                  )
+        mc.text("char_page_label",
+                parent="char_header",
+                label="",
+                width=110,
+                align="center"
+                )
+        mc.button("char_page_next",
+                  parent="char_header",
+                  label=">",
+                  width=28,
+                  command=lambda *_: self._change_page(1)
+                  )
 
-        scene_chars = lxg.get_scene_characters(all_chars)
+        mc.columnLayout("char_list",
+                        parent="char_column",
+                        width=400,
+                        height=self.page_size * self.row_height,
+                        rowSpacing=0
+                        )
 
-        flg.debug("Characters Found: ")
-        for c in scene_chars:
-            flg.debug(c.get_charName())
+        self._show_page(0)
+
+    def _filter_characters(self, text):
+        self.char_filter = text.strip().lower()
+        self._apply_filter()
+        self._show_page(0)
+
+    def _apply_filter(self):
+        self.filtered_chars = [c for c in self.listed_chars
+                               if self.char_filter in c.get_charName().lower()
+                               or self.char_filter in (c.get_charAltName() or "").lower()]
+        mlg.debug("Filter %r matches %s characters", self.char_filter, len(self.filtered_chars))
+
+    def _change_page(self, step):
+        self._show_page(self.char_page + step)
+
+    def _get_page_count(self):
+        return max(1, int(math.ceil(len(self.filtered_chars) / float(self.page_size))))
+
+    def _show_page(self, page, changed=()):
+        """
+        Shows the given page of the filtered characters in the character list.  Rows already showing the right
+        characters are kept, the ones after the first difference are rebuilt.
+        :param page: The page index, clamped to the pages there are
+        :param changed: Names of kept characters whose catalog entry changed, their rows are updated in place
+        :return: Nothing
+        """
+        page_count = self._get_page_count()
+        self.char_page = max(0, min(page, page_count - 1))
+
+        first = self.char_page * self.page_size
+        page_chars = self.filtered_chars[first:first + self.page_size]
+        rows = ["{}_row".format(c.get_charName()) for c in page_chars]
+
+        # A columnLayout only appends, so rows can be kept up to the first one out of place
+        old_rows = mc.layout("char_list", query=True, childArray=True) or []
+        kept = 0
+        while kept < min(len(rows), len(old_rows)) and rows[kept] == old_rows[kept]:
+            kept += 1
+
+        if old_rows[kept:]:
+            mc.deleteUI(old_rows[kept:])
+
+        for c in page_chars[:kept]:
+            if c.get_charName() in changed:
+                self._update_character_panel(c)
+        for c in page_chars[kept:]:
+            self._create_character_panel(c, "char_list")
+
+        mc.text("char_page_label",
+                edit=True,
+                label="{0} of {1}  ({2})".format(self.char_page + 1, page_count, len(self.filtered_chars))
+                )
+        mc.button("char_page_prev", edit=True, enable=self.char_page > 0)
+        mc.button("char_page_next", edit=True, enable=self.char_page < page_count - 1)
 
-        return scene_chars
+        mlg.info("Showing page %s of %s", self.char_page + 1, page_count)
 
-    def _create_character_frame(self, characters, parent):
+    def _create_character_panel(self, character, parent):
+        """
+        Builds one compact character row: name, collection menu and the per character actions
+        :param character: A Character object
+        :param parent: The character list layout
+        :return: The row's name
+        """
+        row_layout = "{}_row".format(character.get_charName())
+
+        reference_mode = self.config.get_hair_mode() == lxg.REFERENCE
+
+        mc.rowLayout(row_layout,
+                     parent=parent,
+                     width=400,
+                     height=self.row_height,
+                     numberOfColumns=6,
+                     columnWidth6=[110, 80, 50, 50, 50, 50],
+                     enableBackground=True,
+                     backgroundColor=[0.3, 0.3, 0.3]
+                     )
+        mc.text("{}_label".format(character.get_charName()),
+                label="{}".format(character.get_charAltName()),
+                parent=row_layout,
+                width=105,
+                align="left",
+                font="boldLabelFont"
+                )
 
-        flg = logging.getLogger("lettuce._create_character_frame")
+        hair_drop_down = "{}_hair".format(character.get_charName())
 
-        frames = []
-        frame_objects = []
+        mc.optionMenu(hair_drop_down,
+                      parent=row_layout,
+                      width=78
+                      )
+        self._add_collection_items(character, hair_drop_down)
 
-        flg.info("Exactly {} characters".format(len(characters)))
+        mc.button("{}_copy".format(character.get_charName()),
+                  label="Copy",
+                  parent=row_layout,
+                  width=48,
+                  annotation="Copy Description"
+                  )
+        mc.button("{}_import".format(character.get_charName()),
+                  label="Import",
+                  parent=row_layout,
+                  width=48,
+                  annotation="Import Hair"
+                  )
+        mc.button("{}_delete".format(character.get_charName()),
+                  label="Delete",
+                  parent=row_layout,
+                  width=48,
+                  annotation="Delete Hair"
+                  )
 
-        if len(characters) < 2:
-            flg.info("Less than 2 characters")
+        if reference_mode:
+            mc.button("{}_load".format(character.get_charName()),
+                      label="Load",
+                      parent=row_layout,
+                      width=48,
+                      annotation="Load Hair"
+                      )
 
-            name = 'row0'
+        self._bind_character_panel(character)
 
-            flg.info("Created row: {}".format(name))
+        return row_layout
 
-            frame_row = mc.rowLayout(name,
-                                     parent=parent,
-                                     width=400,
-                                     numberOfColumns=2,
-                                     columnWidth2=[200, 200]
-                                     )
-            frames.append(name)
-            frame_objects.append(frame_row)
-        else:
-            flg.info("More than 2 characters")
-            rows_to_make = int(math.ceil(len(characters)*0.5))
-            flg.info("Going to create {0} rows to contain {1} characters.".format(rows_to_make,
-                                                                                  len(characters)
-                                                                                  ))
-            for i in range(0, rows_to_make):
-                name = 'row{}'.format(i)
-
-                flg.info("Created row: {}".format(name))
-
-                frame_row = mc.rowLayout(name,
-                                         parent=parent,
-                                         width=400,
-                                         numberOfColumns=2,
-                                         columnWidth2=[200, 200]
-                                         )
-                frames.append(name)
-                frame_objects.append(frame_row)
-                mc.window(self.uiWindow,
-                          widthHeight=(406, (rows_to_make * 200) + 2),
-                          edit=True,
-                          )
-
-        flg.info("Created {} total rows".format(len(frames)))
-
-        index = 0
-
-        for f in frames:
-            for c in range(index, len(characters)):
-                flg.info("Creating panel: {0}; number {1}; in frame {2}".format(characters[c].get_charName(),
-                                                                                c,
-                                                                                f
-                                                                                ))
-                self._create_character_panel(characters[c], f)
-                if index % 2 == 1:
-                    index += 1
-                    break
-                index += 1
+    def _update_character_panel(self, character):
+        """
+        Refreshes an existing row for a character whose catalog entry changed: its label, collection menu and actions
+        :param character: The new Character object, carrying the collection picked in the old one when it still exists
+        :return: Nothing
+        """
+        mlg.info("Updating row of %s", character.get_charName())
 
-    def _create_character_panel(self, character, parent):
+        hair_drop_down = "{}_hair".format(character.get_charName())
 
-        flg = logging.getLogger("lettuce._create_character_panel")
+        mc.text("{}_label".format(character.get_charName()), edit=True, label="{}".format(character.get_charAltName()))
 
-        col_layout = "{}_panel".format(character.get_charName())
-        root_layout = "{}_frame".format(character.get_charName())
+        old_items = mc.optionMenu(hair_drop_down, query=True, itemListLong=True) or []
+        if old_items:
+            mc.deleteUI(old_items)
+        self._add_collection_items(character, hair_drop_down)
 
-        mc.frameLayout(root_layout,
-                       labelVisible=False,
-                       parent=parent,
-                       width=200,
-                       marginWidth=10
-                       )
+        self._bind_character_panel(character)
 
-        flg.info("Panel name: {}".format(col_layout))
-        mc.columnLayout(col_layout,
-                        parent=root_layout,
-                        width=180,
-                        height=200,
-                        enableBackground=True,
-                        backgroundColor=[0.3, 0.3, 0.3]
+    def _add_collection_items(self, character, hair_drop_down):
+        for i in character.get_collections():
+            mc.menuItem("{0}_{1}".format(hair_drop_down, i.get_version()),
+                        label="{}".format(i.get_version()),
+                        parent=hair_drop_down
                         )
-        mc.text(label="{}".format(character.get_charAltName()),
-                width=180,
-                align="center",
-                font="boldLabelFont"
-                )
 
-        mc.text(label=" ")
+        # Rows are rebuilt when paging, the menu shows the collection picked earlier
+        mc.optionMenu(hair_drop_down, edit=True, value=character.get_current_collection().get_version())
 
-        hair_drop_down = "{}_hair".format(character.get_charName())
+    def _bind_character_panel(self, character):
+        # Points the row's controls at character, an updated row must stop acting on the Character it was built for
+        name = character.get_charName()
+        hair_drop_down = "{}_hair".format(name)
 
         mc.optionMenu(hair_drop_down,
-                      parent=col_layout,
-                      width=180,
+                      edit=True,
                       changeCommand=lambda *_: self._collection_menu_change(character, hair_drop_down)
                       )
-        for i in character.get_collections():
-            mc.menuItem("{0}_{1}".format(hair_drop_down, i.get_version()),
-                        label="{}".format(i.get_version()),
-                        parent=hair_drop_down
-                        )
-            flg.info("Creating Menu Item for {}".format(i.get_version()))
-
-        mc.text(label=" ")
+        mc.button("{}_copy".format(name), edit=True, command=lambda *_: self._copy_desc(character))
+        mc.button("{}_import".format(name), edit=True, command=lambda *_: self._import_hair(character))
+        mc.button("{}_delete".format(name), edit=True, command=lambda *_: self._delete_hair(character))
 
-        mc.button(label="Copy Description",
-                  parent=col_layout,
-                  width=180,
-                  command=lambda *_: self._copy_desc(character)
-                  )
-        mc.button(label="Import Hair",
-                  parent=col_layout,
-                  width=180,
-                  command=lambda *_: self._import_hair(character)
-                  )
-        mc.button(label="Delete Hair",
-                  parent=col_layout,
-                  width=180,
-                  command=lambda *_: self._delete_hair(character)
-                  )
+        if mc.button("{}_load".format(name), exists=True):
+            mc.button("{}_load".format(name), edit=True, command=lambda *_: self._load_hair(character))
 
     def _untitled_file_check(self):
-        flg = logging.getLogger("lettuce._untitled_file_check")
-
         if mc.file(q=True, sceneName=True) == "":
-            flg.debug("File is untitled")
+            mlg.debug("File is untitled")
             mc.confirmDialog(
                 title='Untitled Scene',
                 message='This file has never been saved, please save it before working further',
@@ -341,120 +505,167 @@ class LettuceUI:
             )
             return True
         else:
-            flg.debug("File is titled")
+            mlg.debug("File is titled")
             return False
 
     def _copy_all_desc(self):
-
-        flg = logging.getLogger("lettuce._copy_all_desc")
-        flg.info("Copying ALL Descriptions")
+        mlg.info("Copying ALL Descriptions")
 
         if not self._untitled_file_check():
             if self.xml_load_state and self.char_in_scene:
-                lxg.copy_xgen_files(self.char_in_scene_list)
+                self._run_task("Copying descriptions", self._copy_routine, list(self.char_in_scene_list))
             else:
-                flg.warning("Unable to copy descriptions because XML File is not loaded or invalid")
+                mlg.warning("Unable to copy descriptions because XML File is not loaded or invalid")
         else:
-            flg.warning("Unable to copy descriptions because scene is not saved")
+            mlg.warning("Unable to copy descriptions because scene is not saved")
             return
 
     def _copy_desc(self, character):
-
-        flg = logging.getLogger("lettuce._copy_desc")
-        flg.info("Copying Descriptions: {}".format(character.get_charName()))
+        mlg.info("Copying Descriptions: %s", character.get_charName())
 
         if not self._untitled_file_check():
             if self.xml_load_state and self.char_in_scene:
-                lxg.copy_xgen_files([character])
+                self._run_task("Copying description", self._copy_routine, [character])
             else:
-                flg.warning("Unable to copy description because XML File is not loaded or invalid")
+                mlg.warning("Unable to copy description because XML File is not loaded or invalid")
         else:
-            flg.warning("Unable to copy description because scene is not saved")
+            mlg.warning("Unable to copy description because scene is not saved")
             return
 
-    def _import_all_hair(self):
+    def _copy_routine(self, task, characters):
+        # The scene folder and project are queried here, the copy itself runs in the background
+        pairs = lxg.get_xgen_copy_pairs(characters)
+        report = yield in_background(lxg.copy_xgen_pairs, pairs, progress=task)
+        task.set_result(report)
 
-        flg = logging.getLogger("lettuce._import_all_hair")
-        flg.info("Importing ALL Hair")
+    def _import_all_hair(self):
+        mlg.info("Importing ALL Hair")
 
         if self.xml_load_state and self.char_in_scene:
-            set_objects = lxg.import_hairMayaFile(self.char_in_scene_list)
-            for c in self.char_in_scene_list:
-                lxg.wrap_hair_plates(c)
-            for o in set_objects:
-                self.char_hair_sets[o.get_name()] = o
+            self._run_task("Importing hair", self._import_routine, list(self.char_in_scene_list))
         else:
-            flg.warning("Unable to import hair because XML File is not loaded or invalid")
+            mlg.warning("Unable to import hair because XML File is not loaded or invalid")
 
     def _import_hair(self, character):
-
-        flg = logging.getLogger("lettuce._import_hair")
-        flg.info("Importing Hair for {}".format(character.get_charName))
+        mlg.info("Importing Hair for %s", character.get_charName())
 
         if self.xml_load_state and self.char_in_scene:
-            set_objects = lxg.import_hairMayaFile([character])
-            lxg.wrap_hair_plates(character)
+            self._run_task("Importing hair", self._import_routine, [character])
+        else:
+            mlg.warning("Unable to import hair because XML File is not loaded or invalid")
+
+    def _import_routine(self, task, characters):
+        """
+        Stats and caches the hair files in the background, then imports and wraps one character per chunk
+        :param task: The lettuceExecutor.Task
+        :param characters: A list of Character objects
+        """
+        mode = self.config.get_hair_mode()
+        root = lxg.get_asset_root()
+
+        prepared = yield in_background(lxg.prepare_hair_import, characters,
+                                       use_hash=self.config.get_cache_hash(),
+                                       mode=mode,
+                                       root=root,
+                                       progress=task
+                                       )
+
+        task.begin("Importing hair ...", len(characters))
+        for c in characters:
+            # The task shows the progress, each import reports nothing of its own
+            set_objects = lxg.import_hairMayaFile([c],
+                                                  progress=Progress(),
+                                                  use_hash=self.config.get_cache_hash(),
+                                                  mode=mode,
+                                                  defer=self.config.get_hair_defer(),
+                                                  prepared=prepared
+                                                  )
             for o in set_objects:
                 self.char_hair_sets[o.get_name()] = o
-        else:
-            flg.warning("Unable to import hair because XML File is not loaded or invalid")
 
-    def _collection_menu_change(self, character, parent):
+            # Wrapped in the same chunk, a set is only current once wrapped and cancelling must not split the two.
+            # Characters whose hair was already current keep their existing wraps.
+            if [o for o in set_objects if self._needs_wrap(o)]:
+                lxg.wrap_hair_plates(c)
+            task.step()
+            yield
+        task.end()
 
-        flg = logging.getLogger("lettuce._collection_menu_change")
+    def _needs_wrap(self, set_package):
+        # Deferred references have no plates to wrap until they are loaded, see _load_hair
+        if not set_package.is_updated():
+            return False
+        return set_package.get_mode() != lxg.REFERENCE or not self.config.get_hair_defer()
+
+    def _load_hair(self, character):
+        mlg.info("Loading Hair for %s", character.get_charName())
+
+        if self._is_busy():
+            return
+
+        if self.xml_load_state and self.char_in_scene:
+            if lxg.load_hair_reference(lxg.get_hair_set_name(character)):
+                lxg.wrap_hair_plates(character)
+            else:
+                mlg.info("No unloaded hair reference for %s", character.get_charName())
+        else:
+            mlg.warning("Unable to load hair because XML File is not loaded or invalid")
 
+    def _collection_menu_change(self, character, parent):
         menu_item = mc.optionMenu(parent,
                                   value=True,
                                   query=True,
                                   )
-        flg.info("Item: {0} currently selected in menu {1}".format(menu_item, parent))
+        mlg.info("Item: %s currently selected in menu %s", menu_item, parent)
 
         try:
             character.set_current_collection(menu_item)
-            flg.info("Current Collection changed to {}".format(menu_item))
+            mlg.info("Current Collection changed to %s", menu_item)
         except NameError as e:
-            flg.warning("Could not change current collection")
-            flg.warning(e)
+            mlg.warning("Could not change current collection")
+            mlg.warning(e)
 
     def _delete_all_hair(self):
+        mlg.info("Deleting ALL hair sets")
 
-        flg = logging.getLogger("lettuce._delete_all_hair")
-        flg.info("Deleting ALL hair sets")
+        if self._is_busy():
+            return
 
         if self.xml_load_state:
             if self.char_hair_sets:
                 for key in self.char_hair_sets:
                     hair_set = self.char_hair_sets[key].get_name()
 
-                    flg.info("Deleting hair set: {}".format(hair_set))
+                    mlg.info("Deleting hair set: %s", hair_set)
 
                     lxg.delete_set(hair_set)
                 self.char_hair_sets = {}
             else:
-                flg.info("No hair sets currently registered in the scene")
-                flg.info("Checking for un-registered sets")
+                mlg.info("No hair sets currently registered in the scene")
+                mlg.info("Checking for un-registered sets")
                 for c in self.char_in_scene_list:
-                    hair_set = "{}_hairSetSystem".format(c.get_charName())
+                    hair_set = lxg.get_hair_set_name(c)
 
-                    flg.info("Deleting hair set: {}".format(hair_set))
+                    mlg.info("Deleting hair set: %s", hair_set)
 
                     lxg.delete_set(hair_set)
         else:
-            flg.warning("Unable to delete hair because XML File is not loaded or invalid")
+            mlg.warning("Unable to delete hair because XML File is not loaded or invalid")
 
     def _delete_hair(self, character):
+        mlg.info("Deleting hair set: %s", character.get_charName())
 
-        flg = logging.getLogger("lettuce._delete_hair")
-        flg.info("Deleting hair set: {}".format(character.get_charName()))
+        if self._is_busy():
+            return
 
         if self.xml_load_state:
-            hair_set = "{}_hairSetSystem".format(character.get_charName())
+            hair_set = lxg.get_hair_set_name(character)
 
-            flg.info("Deleting hair set: {}".format(hair_set))
+            mlg.info("Deleting hair set: %s", hair_set)
 
             lxg.delete_set(hair_set)
         else:
-            flg.warning("Unable to delete hair because XML File is not loaded or invalid")
+            mlg.warning("Unable to delete hair because XML File is not loaded or invalid")
 
     def _xml_path_menu(self):
         print("Feature unavailable at this time")
@@ -464,55 +675,221 @@ class LettuceUI:
         print("Feature unavailable at this time")
         return
 
+    def _toggle_trace(self, enabled):
+        if enabled:
+            lettuceTrace.enable()
+            return
+
+        tracer = lettuceTrace.disable()
+        if tracer is None:
+            return
+
+        # Written to local disk, a long trace is too large to write to the share from the main thread
+        trace_name = "lettuce_trace_{}.json".format(time.strftime("%y%m%d-%H.%M.%S"))
+        trace_file = os.path.join(tempfile.gettempdir(), trace_name)
+        try:
+            tracer.write_chrome_trace(trace_file)
+            mlg.info("Chrome trace written to: %s", trace_file)
+        except (IOError, OSError) as e:
+            mlg.warning("Unable to write trace, %s.  Error: %s", trace_file, e)
+
+        summary = tracer.summary()
+        mlg.info("Maya command trace:\n%s", summary)
+        print(summary)
+
+    def _clear_catalog_cache(self):
+        mlg.info("Clearing cached catalog for: %s", self.char_xml_file)
+
+        lxg.invalidate_character_cache(self.char_xml_file)
+        self._reloadUI("masterFrame")
+
     def _documentation(self):
         mc.launch(webPage="https://github.com/theacb/lettuce/wiki")
 
     def _reloadUI(self, frame):
+        self._run_task("Reloading", self._reload_routine, frame)
+
+    def _reload_routine(self, task, frame):
+        """
+        Re-reads the catalog in the background and re-scans the scene, then adds, removes or updates only the
+        character rows that differ.  Characters whose catalog entry is unchanged keep their Character object, and with
+        it the collection picked in the UI.  The frame is only rebuilt when the character list appears or disappears.
+        :param task: The lettuceExecutor.Task
+        :param frame: The master frame
+        """
+        if self.config.get_mirror():
+            task.set_status("Mirroring catalog ...")
+            yield in_background(self.config.sync_mirror)
+
+            # A new mirror only holds the xml from here on
+            self.xml_load_state = self._check_xml_file(self.char_xml_file)
+
+        if not self.xml_load_state:
+            self._rebuild_frame(frame)
+            return
+
+        task.begin("Reading catalog ...", 3)
+
+        mlg.info("Retrieving Characters from XML File: %s", self.char_xml_file)
+        all_chars = yield in_background(lxg.load_characters, self.char_xml_file, use_hash=self.config.get_cache_hash())
+        mlg.info("Retrieved %s Characters in XML File", len(all_chars))
+        task.step()
+
+        task.set_status("Scanning scene ...")
+
+        # The scene may have changed since the last scan
+        lxg.invalidate_reference_snapshot()
+        scene_chars = lxg.get_scene_characters(all_chars)
+        task.step()
+
+        if mlg.isEnabledFor(logging.DEBUG):
+            mlg.debug("Characters Found: %s", ", ".join(c.get_charName() for c in scene_chars))
+
+        task.set_status("Mirroring assets ...")
+        yield in_background(lxg.sync_project_mirror, self.config, scene_chars)
+        task.step()
+
+        # The window may have been closed in the meantime
+        if not mc.frameLayout(frame, exists=True):
+            return
+
+        had_list = self.char_in_scene and mc.columnLayout("char_list", exists=True)
+
+        characters, changed = self._merge_characters(self.char_in_scene_list, scene_chars)
+        self.char_in_scene_list = characters
+        self.char_in_scene = len(characters) > 0
+
+        if not (had_list and self.char_in_scene):
+            self._rebuild_frame(frame)
+            return
+
+        mlg.info("Updating Character Menus, %s changed", len(changed))
+        self.listed_chars = list(characters)
+        self._apply_filter()
+        self._show_page(self.char_page, changed)
+
+    def _merge_characters(self, old_chars, new_chars):
+        """
+        Matches a fresh scan against the characters shown so far
+        :param old_chars: The Character objects from the previous scan
+        :param new_chars: The Character objects just found in the scene
+        :return: A tuple of the characters to show, in scan order, and a set of the names whose catalog entry changed
+        """
+        old_by_name = dict((c.get_charName(), c) for c in old_chars)
+
+        characters = []
+        changed = set()
+        for c in new_chars:
+            previous = old_by_name.pop(c.get_charName(), None)
+
+            if previous is None:
+                mlg.info("Character added: %s", c.get_charName())
+            elif previous.is_same_entry(c):
+                # The rows on screen already act on the old object
+                c = previous
+            else:
+                mlg.info("Character changed in catalog: %s", c.get_charName())
+                changed.add(c.get_charName())
+
+                version = previous.get_current_collection().get_version()
+                if version in c.get_collection_versions():
+                    c.set_current_collection(version)
+                else:
+                    mlg.info("Collection %s of %s is gone, using %s", version, c.get_charName(),
+                             c.get_current_collection().get_version())
+
+            characters.append(c)
 
-        flg = logging.getLogger("lettuce._reloadUI")
+        for name in old_by_name:
+            mlg.info("Character removed: %s", name)
 
+        return characters, changed
+
+    def _rebuild_frame(self, frame):
         mc.deleteUI(frame)
-        flg.info("Deleting UI: {}".format(frame))
+        mlg.info("Deleting UI: %s", frame)
 
         mc.frameLayout('masterFrame',
-                       parent=self.uiWindow,
+                       parent="lettuceColumn",
                        label='',
                        width=400,
                        labelVisible=False,
                        marginWidth=0
                        )
 
-        if self.xml_load_state:
-            flg.info("XML File Loaded")
-            self.char_in_scene_list = self._get_characters(self.char_xml_file)
-
-            if len(self.char_in_scene_list) > 0:
-                self.char_in_scene = True
-                flg.info("Characters verified in Scene")
-            else:
-                self.char_in_scene = False
-                flg.info("Characters verified not in scene")
-
         if self.char_in_scene:
-            flg.info("Creating Character Menus")
+            mlg.info("Creating Character Menus")
             self._create_character_frame(self.char_in_scene_list, "masterFrame")
         else:
-            flg.info("Added reload button ")
+            mlg.info("Added reload button ")
             mc.button('reloadButton',
                       label="Reload",
                       command=lambda *_: self._reloadUI("masterFrame")
                       )
 
     def _check_xml_file(self, xml_file):
-
-        flg = logging.getLogger("lettuce._check_xml_file")
-
         if os.path.isfile(xml_file) and os.access(xml_file, os.R_OK):
-            flg.info("Character XML File located at: {}".format(xml_file))
+            mlg.info("Character XML File located at: %s", xml_file)
             return True
         else:
-            flg.info("Unable to access Character XML File located at: {}".format(xml_file))
+            mlg.info("Unable to access Character XML File located at: %s", xml_file)
             return False
 
+    def _run_task(self, name, routine, *args):
+        """
+        Runs a routine on the shared lettuceExecutor, showing its progress in the task bar.  The character list is
+        disabled until it finishes and only one task runs at a time.
+        :param name: Shown in the task bar
+        :param routine: A generator method taking the Task and args, see lettuceExecutor
+        :return: The Task, or None when another task is still running
+        """
+        if self._is_busy():
+            return None
+
+        mc.frameLayout("masterFrame", edit=True, enable=False)
+        mc.button("task_cancel", edit=True, enable=True)
+
+        self.task = lettuceExecutor.get_executor().submit(name, routine, args, listener=self._task_changed)
+        return self.task
+
+    def _is_busy(self):
+        if self.task is None or self.task.is_done():
+            return False
+        mlg.warning("%s is still running, wait for it to finish or cancel it", self.task.get_name())
+        return True
+
+    def _cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def _task_changed(self, task):
+        # Called on the main thread by the executor
+        if not mc.progressBar("task_progress", exists=True):
+            return
+
+        if not task.is_done():
+            mc.text("task_status", edit=True, label=task.get_status())
+            mc.progressBar("task_progress",
+                           edit=True,
+                           maxValue=max(1, task.get_maximum()),
+                           progress=min(task.get_value(), max(1, task.get_maximum()))
+                           )
+            return
+
+        if task.get_state() != lettuceExecutor.DONE:
+            mc.text("task_status", edit=True, label="{0} {1}".format(task.get_name(), task.get_state()))
+        else:
+            mc.text("task_status", edit=True, label="")
+        mc.progressBar("task_progress", edit=True, maxValue=1, progress=0)
+        mc.button("task_cancel", edit=True, enable=False)
+
+        if mc.frameLayout("masterFrame", exists=True):
+            mc.frameLayout("masterFrame", edit=True, enable=True)
+
+        if task.get_result() is not None:
+            mlg.info("%s: %s", task.get_name(), task.get_result())
+
     def refresh_scene(self):
+        if self._is_busy():
+            return
         lxg.save_and_reload_scene()
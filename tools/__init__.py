@@ -1 +1,2 @@
 from rr_wrap import *
+from lazyModule import LazyModule
@@ -0,0 +1,31 @@
+import importlib
+
+# Defers importing a module until one of its attributes is used.  Lets lettuce be imported outside of Maya, and keeps
+# importing it inside Maya cheap, while the modules keep their usual mc.<command> call sites:
+#
+#   mc = LazyModule("maya.cmds")
+
+
+class LazyModule(object):
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return "<LazyModule {0} ({1})>".format(self._name, state)
+
+    def load(self):
+        """ Imports the module on first use """
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def is_loaded(self):
+        return self._module is not None
@@ -18,9 +18,13 @@
 #       I am using.  I also made some changes to make things more pep8-ish as pycharm was yelling at me about it.
 #       Changed cmds to mc.  Added a Docstring.  Removed Michael Clavan's pymel return as I am not using pymel.
 #       Added an option to use a shapeDeformed node if it exists
+#       Added create_wraps, which binds many driven objects to one driver with a single shared base object.
 
 
-import maya.cmds as mc
+from lazyModule import LazyModule
+
+# Resolved on first use, so importing tools does not require Maya
+mc = LazyModule("maya.cmds")
 
 
 def create_wrap(driver, driven, **kwargs):
@@ -37,22 +41,25 @@ def create_wrap(driver, driven, **kwargs):
                     - shapeDeformed: Boolean
     :return: wrap deformer as a pynode object type pm.nt.Wrap
     """
-    
+
+    return create_wraps(driver, [driven], **kwargs)[0]
+
+
+def create_wraps(driver, driven_list, **kwargs):
+    """
+    Wraps several objects to one influence object.  The influence's base mesh and its dropoff/smoothness attributes are
+    created once and shared by every wrap deformer, instead of one full copy of the driver per driven object.
+    :param driver: The influence object
+    :param driven_list: A list of objects getting a deformer
+    :param kwargs: Same as create_wrap
+    :return: A list of wrap deformer names, in the order of driven_list
+    """
+
     influence = driver
-    surface = driven
-    
+
     inf_shapes = mc.listRelatives(influence, shapes=True)
     influenceShape = inf_shapes[0]
 
-    sur_shapes = mc.listRelatives(surface, shapes=True)
-    surfaceShape = sur_shapes[0]
-
-    # create wrap deformer
-    weightThreshold = kwargs.get('weightThreshold', 0.0)
-    maxDistance = kwargs.get('maxDistance', 1.0)
-    exclusiveBind = kwargs.get('exclusiveBind', False)
-    autoWeightThreshold = kwargs.get('autoWeightThreshold', True)
-    falloffMode = kwargs.get('falloffMode', 0)
     shapeDeformed = kwargs.get('shapeDeformed', False)
 
     if shapeDeformed:
@@ -61,31 +68,22 @@ def create_wrap(driver, driven, **kwargs):
                 if "Orig" not in i:
                     influenceShape = i
 
-    wrapData = mc.deformer(surface, type='wrap')
-    wrapNode = wrapData[0]
-
-    mc.setAttr(wrapNode + '.weightThreshold', weightThreshold)
-    mc.setAttr(wrapNode + '.maxDistance', maxDistance)
-    mc.setAttr(wrapNode + '.exclusiveBind', exclusiveBind)
-    mc.setAttr(wrapNode + '.autoWeightThreshold', autoWeightThreshold)
-    mc.setAttr(wrapNode + '.falloffMode', falloffMode)
+    influenceType = mc.nodeType(influenceShape)
 
-    mc.connectAttr(surface + '.worldMatrix[0]', wrapNode + '.geomMatrix')
-    
-    # add influence
+    # add the influence base, created once and shared by every driven object
     duplicateData = mc.duplicate(influence, name=influence + 'Base')
     base = duplicateData[0]
     shapes = mc.listRelatives(base, shapes=True)
     baseShape = shapes[0]
     mc.hide(base)
-    
+
     # create dropoff attr if it doesn't exist
     if not mc.attributeQuery('dropoff', n=influence, exists=True):
         mc.addAttr(influence, sn='dr', ln='dropoff', dv=4.0, min=0.0, max=20.0)
         mc.setAttr(influence + '.dr', k=True)
-    
+
     # if type mesh
-    if mc.nodeType(influenceShape) == 'mesh':
+    if influenceType == 'mesh':
         # create smoothness attr if it doesn't exist
         if not mc.attributeQuery('smoothness', n=influence, exists=True):
             mc.addAttr(influence, sn='smt', ln='smoothness', dv=0.0, min=0.0)
@@ -95,18 +93,48 @@ def create_wrap(driver, driven, **kwargs):
         if not mc.attributeQuery('inflType', n=influence, exists=True):
             mc.addAttr(influence, at='short', sn='ift', ln='inflType', dv=2, min=1, max=2)
 
-        mc.connectAttr(influenceShape + '.worldMesh', wrapNode + '.driverPoints[0]')
-        mc.connectAttr(baseShape + '.worldMesh', wrapNode + '.basePoints[0]')
-        mc.connectAttr(influence + '.inflType', wrapNode + '.inflType[0]')
-        mc.connectAttr(influence + '.smoothness', wrapNode + '.smoothness[0]')
-
     # if type nurbsCurve or nurbsSurface
-    if mc.nodeType(influenceShape) == 'nurbsCurve' or mc.nodeType(influenceShape) == 'nurbsSurface':
+    if influenceType == 'nurbsCurve' or influenceType == 'nurbsSurface':
         # create the wrapSamples attr if it doesn't exist
         if not mc.attributeQuery('wrapSamples', n=influence, exists=True):
             mc.addAttr(influence, at='short', sn='wsm', ln='wrapSamples', dv=10, min=1)
             mc.setAttr(influence + '.wsm', k=True)
 
+    wrapNodes = []
+    for surface in driven_list:
+        wrapNodes.append(_connect_wrap(surface, influence, influenceShape, influenceType, baseShape, **kwargs))
+
+    return wrapNodes
+
+
+def _connect_wrap(surface, influence, influenceShape, influenceType, baseShape, **kwargs):
+    # create wrap deformer
+    weightThreshold = kwargs.get('weightThreshold', 0.0)
+    maxDistance = kwargs.get('maxDistance', 1.0)
+    exclusiveBind = kwargs.get('exclusiveBind', False)
+    autoWeightThreshold = kwargs.get('autoWeightThreshold', True)
+    falloffMode = kwargs.get('falloffMode', 0)
+
+    wrapData = mc.deformer(surface, type='wrap')
+    wrapNode = wrapData[0]
+
+    mc.setAttr(wrapNode + '.weightThreshold', weightThreshold)
+    mc.setAttr(wrapNode + '.maxDistance', maxDistance)
+    mc.setAttr(wrapNode + '.exclusiveBind', exclusiveBind)
+    mc.setAttr(wrapNode + '.autoWeightThreshold', autoWeightThreshold)
+    mc.setAttr(wrapNode + '.falloffMode', falloffMode)
+
+    mc.connectAttr(surface + '.worldMatrix[0]', wrapNode + '.geomMatrix')
+
+    # if type mesh
+    if influenceType == 'mesh':
+        mc.connectAttr(influenceShape + '.worldMesh', wrapNode + '.driverPoints[0]')
+        mc.connectAttr(baseShape + '.worldMesh', wrapNode + '.basePoints[0]')
+        mc.connectAttr(influence + '.inflType', wrapNode + '.inflType[0]')
+        mc.connectAttr(influence + '.smoothness', wrapNode + '.smoothness[0]')
+
+    # if type nurbsCurve or nurbsSurface
+    if influenceType == 'nurbsCurve' or influenceType == 'nurbsSurface':
         mc.connectAttr(influenceShape + '.ws', wrapNode + '.driverPoints[0]')
         mc.connectAttr(baseShape + '.ws', wrapNode + '.basePoints[0]')
         mc.connectAttr(influence + '.wsm', wrapNode + '.nurbsSamples[0]')
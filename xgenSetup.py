@@ -1,50 +1,116 @@
 # Os Import
 import os
 import sys
-import shutil
 import xml.etree.cElementTree as ET
 import time
 import logging
 
-# Maya imports
-import maya.cmds as mc
-import maya.mel as mel
-
 # Inter-module imports
 from lettuceClasses import *
+from lettuceCache import CatalogCache, AssetCache, file_hash
+import lettuceCopy
+import lettuceTrace
 import tools
 
+# Maya imports, resolved on first use so the module can be imported outside of Maya
+mc = tools.LazyModule("maya.cmds")
+mel = tools.LazyModule("maya.mel")
+
 # Creates the configurations variable and sets up some other variables based on that
 mlg = logging.getLogger("lettuce.xgenSetup")
 
+# Local content addressed cache for collection assets, disabled until set_asset_cache is called
+asset_cache = None
+
+# Folder collection assets are read from, the maya project unless set_asset_root points it at a project mirror
+asset_root = None
+
+# How import_hairMayaFile brings a collection's hair file into the scene
+IMPORT = "import"
+REFERENCE = "reference"
+
 
 def generate_characters(xml_file):
     """
     Generates character objects based on the specified xml file
     :param xml_file: A path to the specified xml file
-    :return: A list of all of the character objects generated
+    :return: A CharacterCatalog of all of the character objects generated
     """
-    flg = logging.getLogger("lettuce.xgenSetup.generate_characters")
 
-    flg.info("Parsing XML File: {}".format(xml_file))
-    xml_tree = ET.parse(xml_file)
-    root = xml_tree.getroot()
+    character_objs = CharacterCatalog(iter_characters(xml_file))
 
-    flg.info("Generating {} Characters".format(len(root)))
-    character_objs = []
-    for child in root:
-        try:
-            char = xml_to_char(child)
-            flg.info("Character: {}".format(char))
-            character_objs.append(char)
-        except AttributeError as e:
-            flg.error("Character not created from child, {}".format(child))
-            flg.debug("Error: {}".format(e))
-
-    flg.info("Returning {} Characters".format(len(character_objs)))
+    mlg.info("Returning %s Characters", len(character_objs))
     return character_objs
 
 
+def load_characters(xml_file, force=False, use_hash=False):
+    """
+    Loads the character catalog through the local catalog cache, only re-parsing the xml file when it has changed
+    :param xml_file: A path to the specified xml file
+    :param force: Ignores the cached catalog and re-parses the xml file
+    :param use_hash: Also compares the xml file's content hash, not just its mtime and size
+    :return: A CharacterCatalog of all of the character objects generated
+    """
+
+    try:
+        return CatalogCache(use_hash=use_hash).load(xml_file, generate_characters, force=force)
+    except (IOError, OSError) as e:
+        mlg.warning("Catalog cache unavailable, parsing directly.  Error: %s", e)
+        return generate_characters(xml_file)
+
+
+def invalidate_character_cache(xml_file=None):
+    """
+    Forces the next load_characters call to re-parse the xml file
+    :param xml_file: A path to the specified xml file, every cached catalog is dropped when omitted
+    :return: Nothing
+    """
+    CatalogCache().invalidate(xml_file)
+
+
+def iter_characters(xml_file):
+    """
+    Streams character objects out of the specified xml file.  Each Character is yielded as soon as its <character>
+    element closes and the parsed element is cleared afterwards, so memory stays flat regardless of the file's size.
+    :param xml_file: A path to the specified xml file
+    :return: A generator of Character objects
+    """
+
+    mlg.info("Parsing XML File: %s", xml_file)
+
+    root = None
+    depth = 0
+    count = 0
+
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+
+        # Only direct children of the root element are characters, nested elements are consumed by xml_to_char
+        if depth != 1:
+            continue
+
+        try:
+            char = xml_to_char(elem)
+            mlg.info("Character: %s", char)
+            count += 1
+            yield char
+        except (AttributeError, IndexError) as e:
+            mlg.error("Character not created from child, %s", elem)
+            mlg.debug("Error: %s", e)
+        finally:
+            # Drops the finished element and its already processed siblings
+            elem.clear()
+            root.clear()
+
+    mlg.info("Parsed %s Characters", count)
+
+
 def xml_to_char(element):
     charName = element.get("name")
     charAltName = element.get("altName")
@@ -55,207 +121,712 @@ def xml_to_char(element):
     return Character(charName, charAltName, temp_col, temp_mobj)
 
 
+@lettuceTrace.traced("scan")
 def get_scene_characters(character_objs):
     """
-    Filters the list of character objects to find which ones are present in the scene
-    :param character_objs: A list of character objects defined in the xml file
-    :return: A list of all of the defined characters in the scene
+    Filters the list of character objects to find which ones are present in the scene.  Every scene reference is
+    queried once by the shared SceneReferenceSnapshot, each character's mesh files are then dict lookups.
+    :param character_objs: An iterable of character objects defined in the xml file, a CharacterCatalog or the
+                           iter_characters stream
+    :return: A list of all of the defined characters in the scene, in catalog order and without duplicates
     """
-    flg = logging.getLogger("lettuce.xgenSetup.get_scene_characters")
 
     char_in_scene = []
-    full_ref_list = mc.ls(references=True)
-
-    flg.info("Checking {} scene references for characters".format(len(full_ref_list)))
-    for r in full_ref_list:
-        flg.debug(r)
+    seen = set()
+    snapshot = get_reference_snapshot()
 
     for char in character_objs:
+        if char in seen:
+            continue
         for mobj in char.get_mayaObjects():
-            for ref in full_ref_list:
-                flg.info("Querying reference for {0}/{1}/{2}".format(char.get_charName(),
-                                                                      mobj.get_version(),
-                                                                      ref
-                                                                      ))
-                try:
-                    ref_file_name = os.path.normpath(mc.referenceQuery(ref, filename=True))
-                    if mobj.get_origMeshFile() in ref_file_name:
-                        flg.info("{} is in scene".format(char))
-                        char_in_scene.append(char)
-                except RuntimeError as e:
-                    flg.warning("Unable to query reference, {}.".format(ref))
-                    flg.info("Error: {}".format(e))
-
-    flg.info("{} characters in scene".format(len(char_in_scene)))
+            mesh_file = mobj.get_origMeshFile()
+            if mesh_file and snapshot.find_reference(mesh_file) is not None:
+                mlg.info("%s is in scene", char)
+                char_in_scene.append(char)
+                seen.add(char)
+                break
+
+    mlg.info("%s characters in scene", len(char_in_scene))
     return char_in_scene
 
+
+class SceneReferenceSnapshot:
+    """
+    Captures every scene reference node with its resolved filename and namespace in a single scan.  Shared by the
+    xgenSetup functions through get_reference_snapshot, it must be invalidated whenever references are added or
+    removed, see invalidate_reference_snapshot.
+    """
+
+    def __init__(self):
+        self._references = []
+        self._filenames = {}
+        self._namespaces = {}
+        self._by_namespace = {}
+
+        # Normalized path suffix to reference node, the first reference wins
+        self._suffix_index = {}
+
+        full_ref_list = mc.ls(references=True)
+
+        mlg.info("Capturing %s scene references", len(full_ref_list))
+
+        # Checked once, the loop runs for every reference in the scene
+        debug = mlg.isEnabledFor(logging.DEBUG)
+        for ref in full_ref_list:
+            if debug:
+                mlg.debug(ref)
+            try:
+                ref_file_name = mc.referenceQuery(ref, filename=True)
+            except RuntimeError as e:
+                mlg.warning("Unable to query reference, %s.", ref)
+                mlg.info("Error: %s", e)
+                continue
+
+            try:
+                namespace = mc.referenceQuery(ref, namespace=True).lstrip(":")
+            except RuntimeError:
+                namespace = remove_rn(ref)
+
+            self._references.append(ref)
+            self._filenames[ref] = os.path.normpath(ref_file_name)
+            self._namespaces[ref] = namespace
+            self._by_namespace.setdefault(namespace, ref)
+
+            for suffix in path_suffixes(ref_file_name):
+                self._suffix_index.setdefault(suffix, ref)
+
+    def __len__(self):
+        return len(self._references)
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_references(self):
+        return list(self._references)
+
+    def get_filename(self, ref):
+        return self._filenames.get(ref)
+
+    def get_namespace(self, ref):
+        return self._namespaces.get(ref)
+
+    def find_reference(self, file_path):
+        """
+        Finds the reference node that loads file_path
+        :param file_path: A file path, either absolute or relative to the project as written in the xml
+        :return: The reference node name, or None if the file is not referenced
+        """
+        return self._suffix_index.get(normalize_path(file_path))
+
+    def find_reference_by_namespace(self, namespace):
+        return self._by_namespace.get(namespace)
+
+
+_reference_snapshot = None
+
+
+def get_reference_snapshot():
+    """
+    Returns the shared SceneReferenceSnapshot, capturing it if there is none
+    :return: A SceneReferenceSnapshot
+    """
+    global _reference_snapshot
+
+    if _reference_snapshot is None:
+        _reference_snapshot = SceneReferenceSnapshot()
+    return _reference_snapshot
+
+
+def invalidate_reference_snapshot():
+    """ Drops the shared SceneReferenceSnapshot, the next get_reference_snapshot call re-scans the scene """
+
+    global _reference_snapshot
+
+    mlg.debug("Scene reference snapshot invalidated")
+
+    _reference_snapshot = None
+
 # Copies the (char).xgen files from their original locations to the scene folder
 
 
-def copy_xgen_files(character):
+def copy_xgen_files(character, workers=4, compare_hash=False, progress=None):
     """
-    Copies xgen files from their central location to the scene folder
+    Copies xgen files from their central location to the scene folder.  Files are copied concurrently, files already
+    up to date in the scene folder are skipped and a failed file does not stop the others.
     :param character: A list of Character objects to process
-    :return: Nothing
+    :param workers: The number of copy threads
+    :param compare_hash: Compares file contents to decide whether a file is up to date, instead of mtimes
+    :param progress: A lettuceClasses.Progress, defaults to Maya's main progress bar when Maya has a UI
+    :return: A lettuceCopy.CopyReport
     """
-    flg = logging.getLogger("lettuce.xgenSetup.copy_xgen_files")
 
-    current_file_dir = get_scene_folder()
-    project_dir = get_project_dir()
+    return copy_xgen_pairs(get_xgen_copy_pairs(character), workers, compare_hash, progress)
 
-    flg.info("Current Scene's folder: {}".format(current_file_dir))
-    flg.info("Current Project's folder: {}".format(project_dir))
 
-    gMainProgressBar = mel.eval('$tmp = $gMainProgressBar')
+def get_xgen_copy_pairs(character):
+    """
+    Lists the xgen files copy_xgen_files copies, the Maya queries of the copy
+    :param character: A list of Character objects to process
+    :return: A list of (xgen file, scene folder) tuples for copy_xgen_pairs
+    """
 
-    mc.progressBar(gMainProgressBar,
-                   edit=True,
-                   beginProgress=True,
-                   isInterruptable=True,
-                   status='Copying XGen Files ...',
-                   maxValue=len(character)
-                   )
-    step = 0
+    current_file_dir = get_scene_folder()
+    project_dir = get_asset_root()
 
-    flg.info("Copying {} XGen files".format(len(character)))
+    mlg.info("Current Scene's folder: %s", current_file_dir)
+    mlg.info("Current Project's folder: %s", project_dir)
 
+    pairs = []
     for c in character:
-        if mc.progressBar(gMainProgressBar, query=True, isCancelled=True):
-            flg.info("Progress Interrupted by user")
-            flg.info("Canceled on step: {0} of {1}".format(step, len(character)))
-            break
         collection = c.get_default_collection()
 
-        flg.info("Character: {}".format(c.get_charName()))
-        flg.debug("Collection: {}".format(collection))
+        mlg.info("Character: %s", c.get_charName())
+        mlg.debug("Collection: %s", collection)
 
-        xg_file = collection.get_xgenFile()
-        xg_file_resolved = os.path.join(project_dir, xg_file)
+        xg_file_resolved = os.path.join(project_dir, collection.get_xgenFile())
+
+        mlg.info("Queuing file from: %s to %s", xg_file_resolved, current_file_dir)
+        pairs.append((xg_file_resolved, current_file_dir))
+
+    return pairs
 
-        flg.info("Copying file from: {0} to {1}".format(xg_file_resolved, current_file_dir))
-        flg.info("...")
-        try:
-            shutil.copy2(xg_file_resolved, current_file_dir)
-            flg.info("Complete")
-        except IOError as e:
-            mc.progressBar(gMainProgressBar, edit=True, endProgress=True)
-            flg.error("IO Error, copying failed.  {}".format(e))
-            break
-        step += 1
-        mc.progressBar(gMainProgressBar, edit=True, step=step)
 
-    flg.info("Complete, {} characters copied".format(len(character)))
-    mc.progressBar(gMainProgressBar, edit=True, endProgress=True)
+@lettuceTrace.traced("copy")
+def copy_xgen_pairs(pairs, workers=4, compare_hash=False, progress=None):
+    """
+    Copies the files listed by get_xgen_copy_pairs.  Given a progress, no Maya commands are called, so the copy can
+    run on a background thread.
+    :param pairs: A list of (xgen file, destination folder) tuples
+    :param workers: The number of copy threads
+    :param compare_hash: Compares file contents to decide whether a file is up to date, instead of mtimes
+    :param progress: A lettuceClasses.Progress, defaults to Maya's main progress bar when Maya has a UI
+    :return: A lettuceCopy.CopyReport
+    """
+
+    resolve = None
+    if asset_cache is not None:
+        resolve = asset_cache.resolve
+
+    progress = get_progress(progress)
+    progress.begin('Copying XGen Files ...', len(pairs))
+
+    mlg.info("Copying %s XGen files", len(pairs))
+
+    # Both callbacks run on the calling thread, the copies themselves run on the pool
+    def job_finished(job):
+        mlg.info("%s", job)
+        progress.step()
+
+    try:
+        report = lettuceCopy.copy_files(pairs,
+                                        workers=workers,
+                                        compare_hash=compare_hash,
+                                        progress=job_finished,
+                                        cancelled=progress.is_cancelled,
+                                        resolve=resolve
+                                        )
+    finally:
+        progress.end()
+
+    for job in report.get_failed():
+        mlg.error("IO Error, copying %s failed.  %s", job.get_src(), job.get_error())
+
+    if report.get_cancelled():
+        mlg.info("Progress Interrupted by user")
+
+    mlg.info("Complete, %s", report)
+    return report
 
 # Imports the maya file containing the hair system into the file
 
 
-def import_hairMayaFile(character):
+@lettuceTrace.traced("import")
+def import_hairMayaFile(character, progress=None, force=False, use_hash=False, mode=IMPORT, defer=True, prepared=None):
     """
     Imports the contents of the mayaFiles specified in the collections for the different characters.
     Creates a set containing each hair system imported.  Deletes old hair systems on import to prevent clashing.
     XGen limitations prevent importing with namespaces.
+    Characters whose hair set already holds the same collection version and source file are skipped, see
+    is_hair_set_current.
+    In REFERENCE mode the hair file is referenced without a namespace instead of imported, by default as a deferred
+    reference whose contents are only loaded by load_hair_reference.  The set then holds the reference node, and the
+    reference points at the project's hair file rather than a local cached or mirrored copy.
     Uses the maya progress bar in case this takes a long time, which also makes it cancellable with the esc key
 
     :param character: A list of Character objects to process
+    :param progress: A lettuceClasses.Progress, defaults to Maya's main progress bar when Maya has a UI
+    :param force: Re-imports every character, even the ones that are up to date
+    :param use_hash: Compares the source file's content hash as well as its mtime
+    :param mode: IMPORT or REFERENCE
+    :param defer: In REFERENCE mode, leaves the reference unloaded
+    :param prepared: The result of prepare_hair_import for these characters, saves reading the hair files again
     :return: A class object containing nodes that were imported
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.import_hairMayaFile")
+    if prepared is None:
+        prepared = {}
 
     set_packages = []
 
     # Maya progress bar setup
-    gMainProgressBar = mel.eval('$tmp = $gMainProgressBar')
-
-    mc.progressBar(gMainProgressBar,
-                   edit=True,
-                   beginProgress=True,
-                   isInterruptable=True,
-                   status='Importing Hair System ...',
-                   maxValue=len(character)
-                   )
+    progress = get_progress(progress)
+    progress.begin('Importing Hair System ...', len(character))
     step = 0
 
-    flg.info("Importing {} hair system files".format(len(character)))
+    mlg.info("Importing %s hair system files", len(character))
 
     # For loop allows a list of all characters or a list of a single character for flexibility
     for c in character:
         imported_nodes = []
 
         # Allows the user to cancel the evaluation of the script
-        if mc.progressBar(gMainProgressBar, query=True, isCancelled=True):
-            flg.info("Progress Interrupted by user")
-            flg.info("Canceled on step: {0} of {1}".format(step, len(character)))
-            flg.info("Cancelled at beginning of loop")
+        if progress.is_cancelled():
+            mlg.info("Progress Interrupted by user")
+            mlg.info("Canceled on step: %s of %s", step, len(character))
+            mlg.info("Cancelled at beginning of loop")
             break
 
-        flg.info("Character: {}".format(c.get_charName()))
-        set_name = "{}_hairSetSystem".format(c.get_charName())
+        mlg.info("Character: %s", c.get_charName())
+        set_name = get_hair_set_name(c)
+
+        mlg.info("Generating character set name: %s", set_name)
+
+        collection = c.get_default_collection()
+        if c.get_charName() in prepared:
+            stamp, ma_file = prepared[c.get_charName()]
+        else:
+            stamp = hair_source_stamp(collection, use_hash)
+            stamp["mode"] = mode
+            ma_file = None
 
-        flg.info("Generating character set name: {}".format(set_name))
+        if not force and is_hair_set_current(set_name, stamp):
+            mlg.info("Hair set is up to date, skipping: %s", set_name)
+            set_packages.append(SetPackage([mc.sets(set_name, query=True) or []], set_name, updated=False, mode=mode))
+            step += 1
+            progress.step()
+            continue
 
         delete_set(set_name)
 
         # Allows the user to cancel the evaluation of the script
-        if mc.progressBar(gMainProgressBar, query=True, isCancelled=True):
-            flg.info("Progress Interrupted by user")
-            flg.info("Canceled on step: {0} of {1}".format(step, len(character)))
-            flg.info("Cancelled after set sanitization")
+        if progress.is_cancelled():
+            mlg.info("Progress Interrupted by user")
+            mlg.info("Canceled on step: %s of %s", step, len(character))
+            mlg.info("Cancelled after set sanitization")
             break
 
-        collection = c.get_default_collection()
-        ma_file = collection.get_hairMayaFile()
-
-        flg.debug("Collection: {}".format(collection))
-        flg.info("Importing file: {}".format(ma_file))
-
-        new_nodes = mc.file(ma_file,
-                            i=True,
-                            preserveReferences=True,
-                            defaultNamespace=True,
-                            returnNewNodes=True,
-                            )
+        if mode == REFERENCE:
+            ma_file = get_reference_file(collection.get_hairMayaFile())
+        elif ma_file is None:
+            ma_file = resolve_asset(collection.get_hairMayaFile())
+
+        mlg.debug("Collection: %s", collection)
+        mlg.info("Importing file: %s", ma_file)
+
+        if mode == REFERENCE:
+            ref_file = mc.file(ma_file,
+                               reference=True,
+                               deferReference=defer,
+                               mergeNamespacesOnClash=True,
+                               namespace=":",
+                               )
+            new_nodes = [mc.referenceQuery(ref_file, referenceNode=True)]
+        else:
+            new_nodes = mc.file(ma_file,
+                                i=True,
+                                preserveReferences=True,
+                                defaultNamespace=True,
+                                returnNewNodes=True,
+                                )
         imported_nodes.append(new_nodes)
 
-        flg.debug("Imported Nodes:")
-        for n in new_nodes:
-            flg.debug(n)
+        # Imports preserve references and references add one, so the scene's reference list has changed
+        invalidate_reference_snapshot()
+
+        if mlg.isEnabledFor(logging.DEBUG):
+            mlg.debug("Imported Nodes:\n%s", "\n".join(new_nodes))
 
         # Naming the set and setting the description with it's import time.
-        mc.sets(new_nodes,
-                name=set_name,
-                text="Contains the hair setup for {0}.  Created at {1} on {2}.".format(c.get_charName(),
-                                                                                       time.strftime("%H:%M:%S"),
-                                                                                       time.strftime("%y%m%d")
-                                                                                       )
-                )
+        set_text = "Contains the hair setup for {0}.  Created at {1} on {2}.".format(c.get_charName(),
+                                                                                     time.strftime("%H:%M:%S"),
+                                                                                     time.strftime("%y%m%d")
+                                                                                     )
+        hair_set = mc.sets(new_nodes,
+                           name=set_name,
+                           text=set_text
+                           )
+        set_hair_set_stamp(hair_set, stamp)
+
+        # Until wrap_hair_plates succeeds the set is not current, an interrupted import is redone the next time
+        set_hair_set_wrapped(hair_set, DEFERRED if mode == REFERENCE and defer else UNWRAPPED)
 
         # Allows the user to cancel the evaluation of the script
-        if mc.progressBar(gMainProgressBar, query=True, isCancelled=True):
-            flg.info("Progress Interrupted by user")
-            flg.info("Canceled on step: {0} of {1}".format(step, len(character)))
-            flg.info("Cancelled after import")
+        if progress.is_cancelled():
+            mlg.info("Progress Interrupted by user")
+            mlg.info("Canceled on step: %s of %s", step, len(character))
+            mlg.info("Cancelled after import")
             break
 
-        flg.info("Creating return package")
-        flg.info("Returning {} hair system nodes".format(len(imported_nodes)))
+        mlg.info("Creating return package")
+        mlg.info("Returning %s hair system nodes", len(imported_nodes))
 
-        package = SetPackage(imported_nodes, set_name)
+        package = SetPackage(imported_nodes, set_name, mode=mode)
 
         set_packages.append(package)
 
         # Advances the progress bar
         step += 1
-        mc.progressBar(gMainProgressBar, edit=True, step=step)
+        progress.step()
 
     # Closes the progress bar when complete
-    mc.progressBar(gMainProgressBar, edit=True, endProgress=True)
+    progress.end()
 
-    flg.debug("Returning packages : {}".format(set_packages))
+    mlg.debug("Returning packages : %s", set_packages)
 
     return set_packages
 
+
+def prepare_hair_import(character, use_hash=False, mode=IMPORT, root=None, progress=None):
+    """
+    Stats the hair files of the characters' default collections and fetches them into the asset cache ahead of
+    import_hairMayaFile.  Given root, only the file system is touched, so this can run on a background thread.
+    :param character: A list of Character objects to process
+    :param use_hash: Compares the source file's content hash as well as its mtime
+    :param mode: IMPORT or REFERENCE, as passed to import_hairMayaFile
+    :param root: The asset root, get_asset_root() when omitted
+    :param progress: A lettuceClasses.Progress, reports nothing by default
+    :return: A dict of character names to (stamp, hair file) tuples, for import_hairMayaFile's prepared.  The hair
+             file is None in REFERENCE mode.
+    """
+
+    if root is None:
+        root = get_asset_root()
+    if progress is None:
+        progress = Progress()
+
+    prepared = {}
+
+    progress.begin("Checking hair files ...", len(character))
+    try:
+        for c in character:
+            if progress.is_cancelled():
+                mlg.info("Progress Interrupted by user")
+                break
+
+            collection = c.get_default_collection()
+            stamp = hair_source_stamp(collection, use_hash, root)
+            stamp["mode"] = mode
+
+            # References are made to the project's file, see get_reference_file, only imports read the local copies
+            ma_file = None
+            if mode != REFERENCE:
+                ma_file = resolve_asset(collection.get_hairMayaFile(), root)
+
+            prepared[c.get_charName()] = (stamp, ma_file)
+            progress.step()
+    finally:
+        progress.end()
+
+    return prepared
+
+
+def get_hair_set_name(character):
+    """ The name of the set holding a character's imported hair system """
+    return "{}_hairSetSystem".format(character.get_charName())
+
+
+# Hair set attribute names to hair_source_stamp keys
+HAIR_SET_STAMP = (("lettuceVersion", "version"),
+                  ("lettuceSource", "source"),
+                  ("lettuceMtime", "mtime"),
+                  ("lettuceHash", "hash"),
+                  ("lettuceMode", "mode")
+                  )
+
+# Hair set attribute recording whether the plates were wrapped, a set only counts as current once they are
+WRAPPED_ATTR = "lettuceWrapped"
+WRAPPED = "wrapped"
+UNWRAPPED = ""
+
+# A deferred reference has no plates to wrap until load_hair_reference loads it
+DEFERRED = "deferred"
+
+
+def hair_source_stamp(collection, use_hash=False, root=None):
+    """
+    Describes the hair file a collection imports, to tell whether an existing hair set is still current
+    :param collection: A character collection
+    :param use_hash: Adds the md5 of the file's contents
+    :param root: The asset root, get_asset_root() when omitted
+    :return: A dict of version, source, mtime, hash and mode strings, mtime and hash are empty when the file can't be
+             read
+    """
+
+    source = collection.get_hairMayaFile()
+    stamp = {"version": collection.get_version() or "",
+             "source": normalize_path(source),
+             "mtime": "",
+             "hash": "",
+             "mode": IMPORT
+             }
+
+    if root is None:
+        root = get_asset_root()
+
+    source_file = os.path.join(root, source)
+    try:
+        stamp["mtime"] = repr(os.path.getmtime(source_file))
+        if use_hash:
+            stamp["hash"] = file_hash(source_file)
+    except (IOError, OSError) as e:
+        mlg.warning("Unable to stat hair file, %s.  Error: %s", source_file, e)
+
+    return stamp
+
+
+def get_hair_set_stamp(set_name):
+    """
+    Reads the source stamp recorded on a hair set
+    :param set_name: A string containing the name of a maya set
+    :return: A stamp dict like hair_source_stamp's, or None if the set does not exist or was never stamped
+    """
+    if not mc.objExists(set_name) or not mc.attributeQuery("lettuceSource", node=set_name, exists=True):
+        return None
+
+    stamp = {}
+    for attr, key in HAIR_SET_STAMP:
+        try:
+            stamp[key] = mc.getAttr("{0}.{1}".format(set_name, attr)) or ""
+        except (ValueError, RuntimeError):
+            stamp[key] = ""
+
+    # Sets stamped before reference mode existed were imported
+    stamp["mode"] = stamp["mode"] or IMPORT
+    return stamp
+
+
+def set_hair_set_stamp(set_name, stamp):
+    """
+    Records a source stamp on a hair set as string attributes
+    :param set_name: A string containing the name of a maya set
+    :param stamp: A dict from hair_source_stamp
+    :return: Nothing
+    """
+    for attr, key in HAIR_SET_STAMP:
+        if not mc.attributeQuery(attr, node=set_name, exists=True):
+            mc.addAttr(set_name, longName=attr, dataType="string")
+        mc.setAttr("{0}.{1}".format(set_name, attr), stamp.get(key, ""), type="string")
+
+
+def get_hair_set_wrapped(set_name):
+    """
+    Reads whether a hair set's plates were wrapped
+    :param set_name: A string containing the name of a maya set
+    :return: WRAPPED, DEFERRED or UNWRAPPED, UNWRAPPED as well for sets stamped before the flag existed
+    """
+    if not mc.objExists(set_name) or not mc.attributeQuery(WRAPPED_ATTR, node=set_name, exists=True):
+        return UNWRAPPED
+    return mc.getAttr("{0}.{1}".format(set_name, WRAPPED_ATTR)) or UNWRAPPED
+
+
+def set_hair_set_wrapped(set_name, state):
+    """
+    Records whether a hair set's plates were wrapped
+    :param set_name: A string containing the name of a maya set
+    :param state: WRAPPED, DEFERRED or UNWRAPPED
+    :return: Nothing
+    """
+    if not mc.attributeQuery(WRAPPED_ATTR, node=set_name, exists=True):
+        mc.addAttr(set_name, longName=WRAPPED_ATTR, dataType="string")
+    mc.setAttr("{0}.{1}".format(set_name, WRAPPED_ATTR), state, type="string")
+
+
+def is_hair_set_current(set_name, stamp):
+    """
+    Checks whether a hair set was imported from the file described by stamp and its plates were wrapped
+    :param set_name: A string containing the name of a maya set
+    :param stamp: A dict from hair_source_stamp
+    :return: True if the set exists, matches the stamp and is wrapped or a deferred reference, a stamp without an
+             mtime never matches
+    """
+
+    if not stamp["mtime"]:
+        return False
+
+    current = get_hair_set_stamp(set_name)
+    if current is None:
+        return False
+
+    for attr, key in HAIR_SET_STAMP:
+        # Sets stamped without a hash still count when no hash is asked for
+        if key == "hash" and not stamp[key]:
+            continue
+        if current[key] != stamp[key]:
+            mlg.debug("Hair set %s is stale, %s: %s != %s", set_name, key, current[key], stamp[key])
+            return False
+
+    if get_hair_set_wrapped(set_name) == UNWRAPPED:
+        mlg.debug("Hair set %s was never wrapped", set_name)
+        return False
+    return True
+
+
+def load_hair_reference(set_name):
+    """
+    Loads the deferred hair references held by a hair set, see import_hairMayaFile's REFERENCE mode
+    :param set_name: A string containing the name of a maya set
+    :return: A list of the reference nodes that were loaded, empty if all of them already were
+    """
+
+    loaded = []
+
+    if not mc.objExists(set_name):
+        mlg.warning("Set, %s, does not exist", set_name)
+        return loaded
+
+    for ref in mc.ls(mc.sets(set_name, query=True) or [], type="reference") or []:
+        if mc.referenceQuery(ref, isLoaded=True):
+            continue
+        mlg.info("Loading reference: %s", ref)
+        mc.file(loadReference=ref)
+        loaded.append(ref)
+
+    if loaded:
+        invalidate_reference_snapshot()
+
+        # The loaded plates still have to be wrapped
+        if mc.attributeQuery(WRAPPED_ATTR, node=set_name, exists=True):
+            set_hair_set_wrapped(set_name, UNWRAPPED)
+    return loaded
+
+
+class MayaProgress(Progress):
+    """ Reports progress on Maya's main progress bar, which also makes the operation cancellable with the esc key """
+
+    def __init__(self):
+        self.bar = mel.eval('$tmp = $gMainProgressBar')
+
+    def begin(self, status, max_value):
+        mc.progressBar(self.bar,
+                       edit=True,
+                       beginProgress=True,
+                       isInterruptable=True,
+                       status=status,
+                       maxValue=max_value
+                       )
+
+    def step(self):
+        mc.progressBar(self.bar, edit=True, step=1)
+
+    def is_cancelled(self):
+        return mc.progressBar(self.bar, query=True, isCancelled=True)
+
+    def end(self):
+        mc.progressBar(self.bar, edit=True, endProgress=True)
+
+
+def get_progress(progress=None):
+    """
+    Picks the progress reporter for a pipeline function
+    :param progress: A Progress given by the caller, returned as is
+    :return: progress, or a MayaProgress in interactive Maya, or a silent Progress in batch mode
+    """
+    if progress is not None:
+        return progress
+    if mc.about(batch=True):
+        return Progress()
+    return MayaProgress()
+
+
+def set_asset_cache(cache):
+    """
+    Routes collection asset reads through a local cache
+    :param cache: A lettuceCache.AssetCache, or None to read straight from the server
+    :return: Nothing
+    """
+    global asset_cache
+    asset_cache = cache
+
+
+def set_asset_root(root):
+    """
+    Reads collection assets from another copy of the project, e.g. lettuceConfig's local mirror
+    :param root: The project folder to read from, or None to read from the maya project
+    :return: Nothing
+    """
+    global asset_root
+    asset_root = root
+
+
+def get_asset_root():
+    """ The project folder collection assets are read from """
+    if asset_root is not None:
+        return asset_root
+    return get_project_dir()
+
+
+def sync_project_mirror(config, character):
+    """
+    Updates the local project mirror with the xml and the default collection files of the given characters
+    :param config: A lettuceConfig.Configuration
+    :param character: A list of Character objects to mirror the assets of
+    :return: A lettuceCopy.CopyReport, or None when mirror mode is off
+    """
+
+    if not config.get_mirror():
+        return None
+
+    project_paths = []
+    for c in character:
+        collection = c.get_default_collection()
+        for p in (collection.get_hairMayaFile(), collection.get_xgenFile()):
+            if p and p not in project_paths:
+                project_paths.append(p)
+
+    mlg.info("Synchronizing %s collection files to the project mirror", len(project_paths))
+    report = config.sync_mirror(project_paths)
+
+    for j in report.get_failed():
+        mlg.warning("Unable to mirror %s.  Error: %s", j.get_src(), j.get_error())
+    return report
+
+
+def resolve_asset(asset_file, root=None):
+    """
+    Resolves a project relative collection asset against the asset root and through the asset cache, when one is set
+    :param asset_file: A file path relative to the project, as written in the xml
+    :param root: The asset root, get_asset_root() when omitted
+    :return: The path of the local cached copy, or the asset's path in the asset root when there is no cache, or
+             asset_file when neither is set or the asset is unavailable
+    """
+
+    if asset_cache is None:
+        if asset_root is None:
+            return asset_file
+        return os.path.join(asset_root, asset_file)
+
+    if root is None:
+        root = get_asset_root()
+
+    try:
+        local_file = asset_cache.resolve(os.path.join(root, asset_file))
+        mlg.info("Resolved %s to %s", asset_file, local_file)
+        return local_file
+    except (IOError, OSError) as e:
+        mlg.warning("Unable to cache asset, %s, reading from the server.  Error: %s", asset_file, e)
+        return asset_file
+
+
+def get_reference_file(asset_file):
+    """
+    The path a collection asset is referenced from.  A reference is saved into the shot, so it always points at the
+    maya project, never at the asset cache or the project mirror, which only exist on this machine.
+    :param asset_file: A file path relative to the project, as written in the xml
+    :return: The asset's path in the maya project
+    """
+    return os.path.join(get_project_dir(), asset_file)
+
 # Wrapper for maya's workspace method
 # Returns the project directory
 
@@ -263,11 +834,9 @@ def import_hairMayaFile(character):
 def get_project_dir():
     """ Queries maya to find the current project directory """
 
-    flg = logging.getLogger("lettuce.xgenSetup.get_project_dir")
-
     proj_dir = mc.workspace(q=True, rootDirectory=True)
 
-    flg.info("Current Project Folder: {}".format(proj_dir))
+    mlg.info("Current Project Folder: %s", proj_dir)
 
     return proj_dir
 
@@ -278,60 +847,110 @@ def get_project_dir():
 def get_scene_folder():
     """ Queries Maya to get the folder containing the current scene """
 
-    flg = logging.getLogger("lettuce.xgenSetup.get_scene_folder")
-
     file_name = mc.file(q=True, sceneName=True)
 
     head, tail = os.path.split(file_name)
 
-    flg.info("Scene fileName: {}".format(tail))
-    flg.info("Scene directory: {}".format(head))
+    mlg.info("Scene fileName: %s", tail)
+    mlg.info("Scene directory: %s", head)
 
     return head
 
 
+@lettuceTrace.traced("delete")
 def delete_set(set_name):
     """
-    Attempts to delete every node in a set, will remove associated references as well
+    Attempts to delete every node in a set, will remove associated references as well.  Each reference is resolved and
+    removed once, the remaining nodes are deleted in one command and only retried one by one if that fails.
     :param set_name: A string containing the name of a maya set
-    :return: Nothing
+    :return: A DeletionReport of what was removed
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.delete_set")
+    mlg.info("Set to delete: %s", set_name)
 
-    flg.info("Set to delete: {}".format(set_name))
+    report = DeletionReport(set_name)
 
-    if mc.objExists(set_name):
-        mc.select(set_name)
-        old_objects = mc.ls(selection=True)
-        flg.debug("Old Objects:")
-        for o in old_objects:
-            flg.debug(o)
-        ref_objects = mc.ls(selection=True, referencedNodes=True)
-
-        ref_del_queue = []
-        if len(ref_objects) > 0:
-            flg.debug("Old Reference Nodes:")
-            for o in ref_objects:
-                flg.debug(o)
-            for o in ref_objects:
-                flg.debug("Queuing {} for reference removal".format(o))
-                top = mc.referenceQuery(o, referenceNode=True)
-                ref_del_queue.append(top)
-        if len(ref_del_queue):
-            for o in ref_del_queue:
-                flg.debug("Removing reference: {}".format(o))
-                ref_file = mc.referenceQuery(o, filename=True)
-                mc.file(ref_file, removeReference=True)
-        for o in old_objects:
+    if not mc.objExists(set_name):
+        return report
+
+    old_objects = mc.sets(set_name, query=True) or []
+    if mlg.isEnabledFor(logging.DEBUG):
+        mlg.debug("Old Objects:\n%s", "\n".join(old_objects))
+
+    ref_objects = mc.ls(old_objects, referencedNodes=True) or []
+
+    # Reference nodes themselves are members when the hair was loaded as a reference
+    ref_del_queue = mc.ls(old_objects, type="reference") or []
+
+    # Nodes sharing a namespace share a reference, so each namespace is resolved once.  Nodes without a namespace
+    # could come from any reference and are resolved one by one.
+    ref_by_namespace = {}
+    snapshot = get_reference_snapshot()
+    for o in ref_objects:
+        namespace = o.split("|")[-1].rpartition(":")[0]
+        if namespace and namespace in ref_by_namespace:
+            continue
+
+        ref = None
+        if namespace:
+            ref = snapshot.find_reference_by_namespace(namespace)
+        if ref is None:
             try:
-                flg.debug("Deleting {}".format(o))
-                mc.delete(o)
-            except ValueError as e:
-                flg.debug("Unable to delete {0}.  Error: {1}".format(o, e))
-        flg.debug("Deleting set: {}".format(set_name))
+                ref = mc.referenceQuery(o, referenceNode=True)
+            except RuntimeError as e:
+                mlg.debug("Unable to query reference of %s.  Error: %s", o, e)
+        if namespace:
+            ref_by_namespace[namespace] = ref
+
+        if ref is not None and ref not in ref_del_queue:
+            mlg.debug("Queuing %s for reference removal", ref)
+            ref_del_queue.append(ref)
+
+    for ref in ref_del_queue:
+        mlg.debug("Removing reference: %s", ref)
+        try:
+            mc.file(referenceNode=ref, removeReference=True)
+            report.references.append(ref)
+        except RuntimeError as e:
+            mlg.warning("Unable to remove reference %s.  Error: %s", ref, e)
+            report.failed.append(ref)
+    if ref_del_queue:
+        invalidate_reference_snapshot()
+
+    # Whatever went away with the references is skipped
+    ref_objects = set(ref_objects) | set(ref_del_queue)
+    remaining = [o for o in old_objects if o not in ref_objects]
+    remaining = mc.ls(remaining) if remaining else []
+
+    if remaining:
+        try:
+            mlg.debug("Deleting %s nodes", len(remaining))
+            mc.delete(remaining)
+            report.nodes.extend(remaining)
+        except (ValueError, RuntimeError) as e:
+            mlg.debug("Batch delete failed, deleting one by one.  Error: %s", e)
+            debug = mlg.isEnabledFor(logging.DEBUG)
+            for o in remaining:
+                # Deleting a parent may already have taken its children
+                if not mc.objExists(o):
+                    report.nodes.append(o)
+                    continue
+                try:
+                    if debug:
+                        mlg.debug("Deleting %s", o)
+                    mc.delete(o)
+                    report.nodes.append(o)
+                except (ValueError, RuntimeError) as e:
+                    mlg.debug("Unable to delete %s.  Error: %s", o, e)
+                    report.failed.append(o)
+
+    if mc.objExists(set_name):
+        mlg.debug("Deleting set: %s", set_name)
         mc.delete(set_name)
 
+    mlg.info("%s", report)
+    return report
+
 
 def unlock_nodes(set_name):
     """
@@ -340,85 +959,150 @@ def unlock_nodes(set_name):
     :return: Nothing
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.unlock_nodes")
-
     if mc.objExists(set_name):
         for o in mc.sets(set_name, query=True):
             if mc.lockNode(o, query=True):
-                flg.info("Unlocking {}".format(o))
+                mlg.info("Unlocking %s", o)
                 mc.lockNode(o, lock=False)
     else:
-        flg.warning("Set, {}, does not exist".format(set_name))
+        mlg.warning("Set, %s, does not exist", set_name)
 
 
 def save_and_reload_scene():
     """ Uses Maya file commands to save the current file and reload it """
 
-    flg = logging.getLogger("lettuce.xgenSetup.save_and_reload_scene")
-
     current_file = mc.file(save=True)
-    flg.info("Current File: {}".format(current_file))
+    mlg.info("Current File: %s", current_file)
     mc.file(current_file, ignoreVersion=True, open=True, force=True)
+    invalidate_reference_snapshot()
 
 
-def wrap_hair_plates(character):
+@lettuceTrace.traced("wrap")
+def wrap_hair_plates(character, refresh=True):
     """
     Wraps the hairplate objects to the character object
     :param character: a Character object, singular
+    :param refresh: Redraws the viewport around the binding, not needed in batch mode
     :return:
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.wrap_hair_plates")
-
-    flg.info("Wrapping hair plates to {}".format(character.get_charName()))
+    mlg.info("Wrapping hair plates to %s", character.get_charName())
 
     char_col = character.get_current_collection()
-    flg.debug("Current Collection: {}".format(char_col))
+    mlg.debug("Current Collection: %s", char_col)
 
     char_mesh = search_namespaces_for_mesh(character)
     char_hair_plates = char_col.get_hairPlates()
-    flg.info("Character mesh object: {}".format(char_mesh))
-    flg.info("Character hair plate objects: {}".format(char_hair_plates))
-
-    deformer_input_list = []
+    mlg.info("Character mesh object: %s", char_mesh)
+    mlg.info("Character hair plate objects: %s", char_hair_plates)
 
     history_list = mc.listHistory(char_mesh)
-    flg.debug("Character mesh history nodes: {}".format(history_list))
+    mlg.debug("Character mesh history nodes: %s", history_list)
+
+    # Node types and attributes are queried in bulk once for the whole wrap
+    history_query = NodeQuery(history_list)
+
+    filtered_list = history_query.filter_types("joint",
+                                               "animCurveUU",
+                                               )
+    mlg.debug("Character mesh history nodes, filtered: %s", filtered_list)
+
+    deformer_input_list = history_query.with_attribute("envelope", filtered_list)
+    mlg.debug("Objects containing envelope attributes: %s", deformer_input_list)
+
+    # Deformers are disabled while binding so the plates wrap to the undeformed mesh
+    with DeformerSuspension(deformer_input_list, refresh=refresh, query=history_query):
+        # Every plate shares one base copy of the character mesh
+        if char_hair_plates:
+            tools.create_wraps(char_mesh, char_hair_plates,
+                               exclusiveBind=True,
+                               falloffMode=1,
+                               shapeDeformed=True
+                               )
+            mlg.info("Binding %s to %s", char_hair_plates, char_mesh)
+
+    set_name = get_hair_set_name(character)
+    if mc.objExists(set_name):
+        set_hair_set_wrapped(set_name, WRAPPED)
+
+
+class DeformerSuspension:
+    """
+    Context manager that disables a list of deformers and restores them exactly as they were on exit, even when the
+    body raises.  Envelopes are set to 0, and with node_state the nodeState is set to HasNoEffect and frozen cleared.
+
+        with DeformerSuspension(deformers, refresh=False):
+            ...
+    """
+
+    def __init__(self, deformers, node_state=False, refresh=True, query=None):
+        """
+        :param deformers: A list of deformer nodes with an envelope attribute
+        :param node_state: Also suspends the nodes' nodeState and frozen flags
+        :param refresh: Redraws the viewport after suspending and before restoring, slow on heavy scenes
+        :param query: The NodeQuery the deformers were filtered with, its attribute lookups are reused rather than
+                      repeated
+        """
+        self.deformers = list(deformers or [])
+        self.node_state = node_state
+        self.refresh = refresh
+        self.query = query if query is not None else NodeQuery(self.deformers)
+
+        # Plug to original value, only for plugs that were actually changed
+        self._saved = []
+
+    def __enter__(self):
+        suspend = [("envelope", 0)]
+        if self.node_state:
+            suspend += [("nodeState", 1), ("frozen", False)]
+
+        # Everything is read before anything is changed.  getAttr reads a single plug per call, maya.cmds has no bulk
+        # read, so this is one call per deformer and attribute.  Only the plugs that differ are written.
+        snapshot = []
+        for attribute, value in suspend:
+            for node in self.query.with_attribute(attribute, self.deformers):
+                plug = "{0}.{1}".format(node, attribute)
+                snapshot.append((plug, mc.getAttr(plug), value))
 
-    filtered_list = node_type_filter(history_list,
-                                     "joint",
-                                     "animCurveUU",
-                                     )
-    flg.debug("Character mesh history nodes, filtered: ".format(filtered_list))
+        try:
+            for plug, original, value in snapshot:
+                if original == value:
+                    continue
+                try:
+                    mc.setAttr(plug, value)
+                    self._saved.append((plug, original))
+                    mlg.info("Suspended %s, was %s", plug, original)
+                except RuntimeError as e:
+                    mlg.warning("Unable to suspend %s.  Error: %s", plug, e)
 
-    for n in filtered_list:
-        print n
-        node_attr = mc.listAttr(n, leaf=True)
-        if "envelope" in node_attr:
-            deformer_input_list.append(n)
-    flg.debug("Objects containing envelope attributes: {}".format(deformer_input_list))
+            if self.refresh:
+                mlg.info("Viewport refresh")
+                mc.refresh()
+        except:
+            self._restore()
+            raise
 
-    for o in deformer_input_list:
-        flg.info("Setting {0} input {1} envelope to 0".format(char_mesh, o))
-        mc.setAttr("{}.envelope".format(o), 0)
+        return self
 
-    flg.info("Viewport refresh")
-    mc.refresh()
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.refresh and exc_type is None:
+            mlg.info("Viewport refresh")
+            mc.refresh()
 
-    for hp in char_hair_plates:
-        tools.create_wrap(char_mesh, hp,
-                          exclusiveBind=True,
-                          falloffMode=1,
-                          shapeDeformed=True
-                          )
-        flg.info("Binding {0} to {1}".format(hp, char_mesh))
+        self._restore()
 
-    flg.info("Viewport refresh")
-    mc.refresh()
+        # Exceptions propagate
+        return False
 
-    for o in deformer_input_list:
-        flg.info("Setting {0} input {1} envelope to 1".format(char_mesh, o))
-        mc.setAttr("{}.envelope".format(o), 1)
+    def _restore(self):
+        # Reverse order undoes nodeState and frozen before envelopes
+        while self._saved:
+            plug, original = self._saved.pop()
+            try:
+                mc.setAttr(plug, original)
+                mlg.info("Restored %s to %s", plug, original)
+            except RuntimeError as e:
+                mlg.error("Unable to restore %s to %s.  Error: %s", plug, original, e)
 
 
 def node_type_filter(node_list, *filter_types):
@@ -429,23 +1113,116 @@ def node_type_filter(node_list, *filter_types):
     :return: The node_list after it has been filtered of specified node types
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.node_type_filter")
+    mlg.info("Filtering Node List")
 
-    flg.info("Filtering Node List")
+    filtered_list = NodeQuery(node_list).filter_types(*filter_types)
 
-    filtered_list = []
-    for node in node_list:
-        node_type = mc.nodeType(node)
-        flg.debug("Node, {0}, is of type, {1}".format(node, node_type))
-        if node_type not in filter_types:
-            flg.debug("Node kept")
-            filtered_list.append(node)
-        else:
-            flg.debug("Node filtered")
-    flg.info("Returning Filtered List")
+    mlg.info("Returning Filtered List")
     return filtered_list
 
 
+class NodeQuery:
+    """
+    Bulk, memoized queries over a fixed list of nodes.  Node types come from a single ls -showType call and attribute
+    existence from a single ls over every node's plug, instead of one nodeType or listAttr round trip per node.
+    """
+
+    def __init__(self, node_list):
+        self.nodes = list(node_list or [])
+
+        self._types = None
+        self._renamed = set()
+        self._attributes = {}
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_nodes(self):
+        return list(self.nodes)
+
+    def get_types(self):
+        """
+        :return: A dict of node to node type
+        """
+
+        if self._types is None:
+            self._types = {}
+
+            if self.nodes:
+                # Returns node, type, node, type, ...
+                typed = mc.ls(self.nodes, showType=True) or []
+                for i in range(0, len(typed) - 1, 2):
+                    self._types[typed[i]] = typed[i + 1]
+
+            # ls may name a node differently than the list it was given, those are asked one by one
+            self._renamed = set()
+            for node in self.nodes:
+                if node not in self._types:
+                    mlg.debug("Querying type of %s directly", node)
+                    self._types[node] = mc.nodeType(node)
+                    self._renamed.add(node)
+
+        return self._types
+
+    def get_type(self, node):
+        return self.get_types().get(node)
+
+    def get_renamed(self):
+        """
+        :return: A set of the nodes ls names differently than they were given, e.g. by a longer DAG path
+        """
+        self.get_types()
+        return self._renamed
+
+    # ---------------------------------------------------
+    #                       Methods
+    # ---------------------------------------------------
+
+    def filter_types(self, *filter_types):
+        """
+        :param filter_types: Node types to leave out
+        :return: The nodes that are not of any of filter_types, in order
+        """
+        types = self.get_types()
+        return [n for n in self.nodes if types[n] not in filter_types]
+
+    def of_types(self, *node_types):
+        """
+        :param node_types: Node types to keep
+        :return: The nodes that are of one of node_types, in order
+        """
+        types = self.get_types()
+        return [n for n in self.nodes if types[n] in node_types]
+
+    def with_attribute(self, attribute, node_list=None):
+        """
+        :param attribute: An attribute name, e.g. envelope
+        :param node_list: A subset of the queried nodes to check, all of them by default
+        :return: The nodes that have the attribute, in order
+        """
+        if attribute not in self._attributes:
+            found = set()
+            if self.nodes:
+                plugs = mc.ls(["{0}.{1}".format(n, attribute) for n in self.nodes]) or []
+                for p in plugs:
+                    found.add(p.rsplit(".", 1)[0])
+
+            # ls may name a node differently than the list it was given, those are asked one by one.  A node ls names
+            # as given and whose plug it did not return simply lacks the attribute.
+            for node in self.get_renamed():
+                if node not in found:
+                    mlg.debug("Querying %s on %s directly", attribute, node)
+                    if mc.attributeQuery(attribute, node=node, exists=True):
+                        found.add(node)
+            self._attributes[attribute] = found
+
+        if node_list is None:
+            node_list = self.nodes
+
+        return [n for n in node_list if n in self._attributes[attribute]]
+
+
 def search_namespaces_for_mesh(character):
     """
     Searches maya namespaces to find a a character's mesh
@@ -453,31 +1230,21 @@ def search_namespaces_for_mesh(character):
     :return: A string containing the name of the character's mesh or just the name of the character's mesh
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.search_namespaces_for_mesh")
-
-    flg.info("Searching namespaces for {}".format(character.get_charName()))
+    mlg.info("Searching namespaces for %s", character.get_charName())
 
     char_mObjs = character.get_current_mayaObjects()
     char_mesh = char_mObjs.get_meshNodeName()
-    flg.info("Character's maya objects: {}".format(char_mObjs.get_version()))
-    flg.info("Character's mesh object: {}".format(char_mesh))
+    mlg.info("Character's maya objects: %s", char_mObjs.get_version())
+    mlg.info("Character's mesh object: %s", char_mesh)
 
-    full_ref_list = mc.ls(references=True)
-    flg.debug("Full scene reference list: ")
-    for r in full_ref_list:
-        flg.debug(r)
+    snapshot = get_reference_snapshot()
 
-    for ref in full_ref_list:
-        try:
-            ref_file_name = os.path.normpath(mc.referenceQuery(ref, filename=True))
-            if char_mObjs.get_origMeshFile() in ref_file_name:
-                flg.debug("Reference file name: ".format(ref_file_name))
-                return "{}:{}".format(remove_rn(ref), char_mesh)
-        except RuntimeError as e:
-            flg.warning("Unable to query reference, {}.".format(ref))
-            flg.debug("Error: {}".format(e))
+    ref = snapshot.find_reference(char_mObjs.get_origMeshFile())
+    if ref is not None:
+        mlg.debug("Reference file name: %s", snapshot.get_filename(ref))
+        return "{}:{}".format(snapshot.get_namespace(ref), char_mesh)
 
-    flg.error("Mesh file, {}, not referenced in this scene.".format(char_mObjs.get_origMeshFile()))
+    mlg.error("Mesh file, %s, not referenced in this scene.", char_mObjs.get_origMeshFile())
     return ""
 
 
@@ -488,10 +1255,8 @@ def remove_rn(reference_node_name):
     :return: Node with reference prefix removed
     """
 
-    flg = logging.getLogger("lettuce.xgenSetup.remove_rn")
-
     last_r = reference_node_name.rfind('R')
     rn_removed = reference_node_name[:last_r]
 
-    flg.info("Converting {0} to {1}.".format(reference_node_name, rn_removed))
+    mlg.info("Converting %s to %s.", reference_node_name, rn_removed)
     return rn_removed